@@ -18,6 +18,9 @@ __author__ = "Sabry Moustafa, Andrew Schultz, and David Kofke"
 __license__ = "Mozilla Public License"
 __email__ = "sabrygad@buffalo.edu, ajs42@buffalo.edu, kofke@buffalo.edu"
 
-from pyhma.vasp_reader   import read
+from pyhma.vasp_reader   import read, read_raw, LiveReader
 from pyhma.processor     import Processor
 
+from pyhma import trajectory
+from pyhma import readers
+from pyhma import batch
@@ -0,0 +1,105 @@
+########################################################################
+# pyHMA: A Python Library for HMA
+#
+# Copyright (c) 2020 University at Buffalo
+#
+# Authors: Sabry Moustafa, Andrew Schultz, and David Kofke
+#
+# pyHMA is free software: you can modify and/or redistribute it under
+# the terms of the Mozilla Public License.
+#
+# pyHMA is distributed in the hope that it will be useful, but without
+# any warranty. See the Mozilla Public License for more details.
+#
+########################################################################
+
+
+"""
+This module provides a row-wise growing NumPy array, used to store per-step data without copying the whole array at each step.
+
+"""
+
+
+import numpy as np
+
+class ArrayBuffer:
+  """
+  A preallocated NumPy array whose rows are filled in place.
+
+  If the number of rows is known, the buffer is sized up front (``capacity``), otherwise
+  its storage grows geometrically so that appending N rows costs O(N) in total.
+
+  Parameters
+  -----------
+  row_shape : tuple
+    Shape of each row (e.g., ``(4,)`` for four columns, or ``()`` for a 1D array).
+  capacity : int
+    Number of rows to allocate up front. *Default: 0*
+  dtype : numpy.dtype
+    Data type of the array. *Default: float*
+
+  """
+
+  def __init__(self, row_shape=(), capacity=0, dtype=float):
+    self.row_shape = tuple(row_shape)
+    self.length    = 0
+    self._array    = np.empty((capacity,) + self.row_shape, dtype=dtype)
+
+  def __len__(self):
+    return self.length
+
+  @property
+  def data(self):
+    """ A view of the filled rows. """
+    return self._array[0:self.length]
+
+  def reserve(self, capacity):
+    """
+    Make sure that the buffer can hold at least ``capacity`` rows without reallocation.
+
+    Parameters
+    ----------
+    capacity : int
+      Number of rows.
+
+    """
+    if capacity > len(self._array):
+      array = np.empty((capacity,) + self.row_shape, dtype=self._array.dtype)
+      array[0:self.length] = self._array[0:self.length]
+      self._array = array
+
+  def append(self, rows):
+    """
+    Append rows at the end of the buffer, growing its storage geometrically if needed.
+
+    Parameters
+    ----------
+    rows : numpy.ndarray
+      Rows to be appended, with shape (n,) + row_shape.
+
+    """
+    n = len(rows)
+    if n == 0:
+      return
+    if self.length + n > len(self._array):
+      self.reserve(max(self.length + n, 2*len(self._array)))
+    self._array[self.length:self.length+n] = rows
+    self.length += n
+
+  def next_row(self):
+    """
+    Return a view of the row that follows the filled rows (storage is grown if needed), so that it can be filled in place.
+    The row is added to the buffer by calling :py:meth:`commit_row`.
+
+    """
+    if self.length == len(self._array):
+      self.reserve(max(1, 2*len(self._array)))
+    return self._array[self.length]
+
+  def commit_row(self):
+    """ Add the row returned by :py:meth:`next_row` to the filled rows. """
+    self.length += 1
+
+  def clear(self):
+    """ Remove all rows (the allocated storage is kept). """
+    self.length = 0
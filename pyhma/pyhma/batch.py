@@ -0,0 +1,281 @@
+########################################################################
+# pyHMA: A Python Library for HMA
+#
+# Copyright (c) 2020 University at Buffalo
+#
+# Authors: Sabry Moustafa, Andrew Schultz, and David Kofke
+#
+# pyHMA is free software: you can modify and/or redistribute it under
+# the terms of the Mozilla Public License.
+#
+# pyHMA is distributed in the hope that it will be useful, but without
+# any warranty. See the Mozilla Public License for more details.
+#
+########################################################################
+
+"""
+**Overview**
+
+A module for computing the anharmonic properties of many state points (e.g., a grid of temperatures and volumes) in one
+batch, and writing them to one table.
+
+The state points are listed in a manifest file, one point per line (``#`` starts a comment)::
+
+  # directory    pressure_qh   steps_eq   blocksize   [files]
+  T1000_V10      4.94525       1000       90
+  T2000_V10      9.12345       auto       auto        OUTCAR*
+
+where ``directory`` is relative to the manifest file, ``steps_eq`` and ``blocksize`` may be ``auto`` (see
+:py:meth:`pyhma.processor.Processor.detect_equilibration` and :py:meth:`pyhma.processor.Processor.scan_blocksizes`), and
+``files`` is a pattern of the trajectory files in the directory (*Default: all files of the format given by*
+``file_format``, *or vasprun*), read in natural order (e.g., vasprun-2.xml before vasprun-10.xml) by the reader of their
+format (see :py:mod:`pyhma.readers`; files of the pattern whose names match no format, e.g., vasprun.xml.1, are read as
+vasprun). Cache files (see :py:mod:`pyhma.cache`) are skipped, and a file that is also found uncompressed (e.g.,
+vasprun-1.xml.bz2 and vasprun-1.xml) is read once.
+
+Each point (read, process, and stats) runs as one task of a pool of processes, and the output files of
+:py:meth:`pyhma.processor.Processor.process` are written to the directory of the point; so, its data is not passed between processes.
+A task is started only if the estimated memory of the running tasks stays within ``memory_limit``, and failed tasks are
+retried.
+
+Example
+--------
+
+.. code-block:: python
+
+  >>> results = pyhma.batch.run('manifest.txt', table='hma_table.dat', workers=4, memory_limit=8*2**30)
+
+"""
+
+import os
+import re
+import glob
+import inspect
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from pyhma import readers
+from pyhma import cache
+from pyhma.processor import Processor
+
+_COLUMNS = ('e_ah_conv', 'e_ah_hma', 'p_ah_conv', 'p_ah_hma')
+_COMPRESSED = ('.bz2', '.gz', '.xz')
+_MEMORY_FACTOR = {ext: 10 for ext in _COMPRESSED} # (rough) size of decompressed/size of compressed files
+
+
+def read_manifest(manifest):
+  """
+  Read a manifest file of state points (see above).
+
+  Parameters
+  -----------
+  manifest : str
+    Path of the manifest file.
+
+  Returns
+  -------
+  points : list
+    A list of dictionaries (``name``, ``directory``, ``pressure_qh``, ``steps_eq``, ``blocksize``, and ``files``; None if not given),
+    one per point.
+
+  """
+  base = os.path.dirname(os.path.abspath(manifest))
+  points = []
+  with open(manifest) as f:
+    for n, line in enumerate(f, 1):
+      fields = line.split('#')[0].split()
+      if len(fields) == 0:
+        continue
+      if len(fields) < 4:
+        print(' WARNING! Line %d of %s: expected directory, pressure_qh, steps_eq, and blocksize.' % (n, manifest))
+        raise RuntimeError('Illegal manifest file.')
+      points.append({'name': fields[0], 'directory': os.path.join(base, fields[0]), 'pressure_qh': float(fields[1]),\
+                     'steps_eq': fields[2] if fields[2] == 'auto' else int(fields[2]),\
+                     'blocksize': fields[3] if fields[3] == 'auto' else int(fields[3]),\
+                     'files': fields[4] if len(fields) > 4 else None})
+  return points
+
+
+def run(manifest, table='hma_table.dat', workers=1, memory_limit=None, retries=1, meV=False, cor_max=0.2, verbose=False, **reader_kwargs):
+  """
+  Compute the anharmonic properties of all state points of a manifest, and write them to one table.
+
+  Parameters
+  -----------
+  manifest : str or list
+    Path of the manifest file, or a list of points (see :py:func:`read_manifest`).
+  table : str
+    Path of the output table (one row per point, in the order of the manifest); None to not write it. *Default: 'hma_table.dat'*
+  workers : int
+    Number of processes; i.e., the maximum number of points computed at the same time. *Default: 1 (serial)*
+  memory_limit : int
+    Memory budget (bytes) of the running points. The memory of a point is estimated by the (decompressed) size of its
+    trajectory files, which is larger than the parsed data; a point larger than the budget runs alone. *Default: None (no limit)*
+  retries : int
+    Number of times a failed point is computed again (e.g., after a worker process was killed). *Default: 1*
+  meV : bool
+    If True, the energies are in meV/atom. *Default: False*
+  cor_max : float
+    Correlation threshold of the block size, for ``blocksize`` = auto (see :py:meth:`pyhma.processor.Processor.scan_blocksizes`). *Default: 0.2*
+  verbose : bool
+    If True, the progress of the points is printed. *Default: False*
+  reader_kwargs : dict
+    Keyword arguments of the reader (see :py:func:`pyhma.readers.read`); e.g., ``file_format``, ``force_tol``, ``temperature``,
+    ``timestep``, and ``ismear``. Arguments that the reader of a point does not accept (e.g., ``fermi_dirac`` for LAMMPS dumps) are not passed.
+
+  Returns
+  -------
+  results : list
+    A list of dictionaries (one per point), with the entries of the point, the ``steps_eq`` and ``blocksize`` used, the
+    ``stats`` dictionary (see :py:meth:`pyhma.processor.Processor.get_stats`; None if failed), ``status`` ('ok' or the error),
+    and the number of ``attempts``.
+
+  """
+  points   = read_manifest(manifest) if isinstance(manifest, str) else manifest
+  results  = [None]*len(points)
+  attempts = [0]*len(points)
+  memory   = [_estimate_memory(p, reader_kwargs.get('file_format')) for p in points]
+  pending  = list(range(len(points)))  # points to be (re)started, in order
+
+  # record the result of an attempt of point i; a failed point is pending again until it runs out of retries
+  def finish(i, result=None, error=None):
+    if error is None:
+      results[i] = dict(points[i], **result, status='ok', attempts=attempts[i])
+    elif attempts[i] <= retries:
+      pending.append(i)
+      pending.sort()
+    else:
+      results[i] = dict(points[i], stats=None, status=error, attempts=attempts[i])
+    if verbose:
+      print(' %-30s attempt %d: %s' % (points[i]['name'], attempts[i], 'ok' if error is None else error))
+
+  if workers <= 1:
+    while pending:
+      i = pending.pop(0)
+      attempts[i] += 1
+      try:
+        finish(i, _run_point(points[i], meV, cor_max, reader_kwargs))
+      except Exception as e:
+        finish(i, error=_error(e))
+  else:
+    executor = ProcessPoolExecutor(workers)
+    running  = {} # future -> point
+    try:
+      while pending or running:
+        # start the pending points (in order) that fit in the memory budget
+        used = sum(memory[i] for i in running.values())
+        for i in list(pending):
+          if len(running) == workers:
+            break
+          if memory_limit is not None and running and used + memory[i] > memory_limit:
+            continue
+          pending.remove(i)
+          attempts[i] += 1
+          running[executor.submit(_run_point, points[i], meV, cor_max, reader_kwargs)] = i
+          used += memory[i]
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        broken = False
+        for future in done:
+          i = running.pop(future)
+          try:
+            finish(i, future.result())
+          except BrokenProcessPool as e:
+            broken = True
+            finish(i, error=_error(e))
+          except Exception as e:
+            finish(i, error=_error(e))
+        if broken:
+          # a killed worker (e.g., out of memory) fails all running points; restart the pool
+          for future, i in running.items():
+            finish(i, error='BrokenProcessPool: worker process terminated')
+          running = {}
+          executor.shutdown(wait=False)
+          executor = ProcessPoolExecutor(workers)
+    finally:
+      executor.shutdown(wait=False)
+
+  if table is not None:
+    write_table(table, results, meV)
+  return results
+
+
+def write_table(table, results, meV=False):
+  """
+  Write the averages and uncertainties of the anharmonic energy and pressure (Conv and HMA) of the state points to a text table.
+  Failed points have NaN values.
+
+  Parameters
+  -----------
+  table : str
+    Path of the output table.
+  results : list
+    Results of the points (see :py:func:`run`).
+  meV : bool
+    If True, the energies are in meV/atom (for the header only). *Default: False*
+
+  """
+  e_units = 'meV/atom' if meV else 'eV/atom'
+  with open(table, 'w') as f:
+    f.write('# energies in %s, pressures in GPa\n' % e_units)
+    f.write('# %-28s %12s %8s %9s' % ('directory', 'pressure_qh', 'steps_eq', 'blocksize'))
+    for c in _COLUMNS:
+      f.write(' %12s %9s' % (c, 'err'))
+    f.write('  status\n')
+    for r in results:
+      f.write('  %-28s %12.5f %8s %9s' % (r['name'], r['pressure_qh'], r['steps_eq'], r['blocksize']))
+      for c in _COLUMNS:
+        if r['stats'] is None:
+          f.write(' %12s %9s' % ('nan', 'nan'))
+        else:
+          f.write(' %12.5f %9.1e' % (r['stats'][c]['avg'], r['stats'][c]['err']))
+      f.write('  %s\n' % r['status'])
+
+
+# trajectory files of a point (see above), in natural order (vasprun-2.xml before vasprun-10.xml)
+def _get_files(point, file_format=None):
+  files = glob.glob(os.path.join(point['directory'], point['files'] or '*'))
+  files = [f for f in files if os.path.isfile(f) and not f.endswith(cache._CACHE_SUFFIX)]
+  if point['files'] is None:
+    files = [f for f in files if readers.get_format(f) == (file_format or 'vasprun')]
+  names = set(files)
+  files = [f for f in files if not (os.path.splitext(f)[1] in _COMPRESSED and os.path.splitext(f)[0] in names)]
+  return sorted(files, key=lambda f: [int(s) if s.isdigit() else s for s in re.split(r'(\d+)', f)])
+
+
+# estimated memory (bytes) of a point; i.e., the (decompressed) size of its trajectory files
+def _estimate_memory(point, file_format=None):
+  return sum(os.path.getsize(f)*_MEMORY_FACTOR.get(os.path.splitext(f)[1], 1) for f in _get_files(point, file_format))
+
+
+# one-line description of an exception
+def _error(e):
+  return '%s: %s' % (type(e).__name__, str(e).strip().replace('\n', ' '))
+
+
+# keyword arguments accepted by the reader of the given files
+def _get_reader_kwargs(files, reader_kwargs):
+  file_format = reader_kwargs.get('file_format') or readers.get_format(files[0]) or 'vasprun'
+  parameters  = inspect.signature(readers._READERS.get(file_format, readers.read)).parameters
+  return {k: v for k, v in reader_kwargs.items() if k == 'file_format' or k in parameters}
+
+
+# read, process, and stats of one point (output files in its directory); returns the steps_eq and blocksize used, and the stats
+def _run_point(point, meV, cor_max, reader_kwargs):
+  files = _get_files(point, reader_kwargs.get('file_format'))
+  if len(files) == 0:
+    raise RuntimeError('No files %s in %s.' % (point['files'] or 'of the %s format' % (reader_kwargs.get('file_format') or 'vasprun'),\
+                       point['directory']))
+  data = readers.read(files, **_get_reader_kwargs(files, reader_kwargs))
+  if data is None:
+    raise RuntimeError('Illegal first configuration (see force_tol) or smearing method.')
+  proc = Processor(data, pressure_qh=point['pressure_qh'], meV=meV)
+  proc.process(output_dir=point['directory'])
+  steps_eq, blocksize = point['steps_eq'], point['blocksize']
+  if steps_eq == 'auto':
+    steps_eq = proc.detect_equilibration()
+  if blocksize == 'auto':
+    blocksize = proc.scan_blocksizes(steps_eq, cor_max=cor_max)['blocksize_suggested']
+    if blocksize is None:
+      raise RuntimeError('No block size with correlations below cor_max=%g.' % cor_max)
+  stats = proc.get_stats(steps_eq=steps_eq, blocksize=blocksize)
+  return {'steps_eq': steps_eq, 'blocksize': blocksize, 'stats': stats}
@@ -0,0 +1,189 @@
+########################################################################
+# pyHMA: A Python Library for HMA
+#
+# Copyright (c) 2020 University at Buffalo
+#
+# Authors: Sabry Moustafa, Andrew Schultz, and David Kofke
+#
+# pyHMA is free software: you can modify and/or redistribute it under
+# the terms of the Mozilla Public License.
+#
+# pyHMA is distributed in the hope that it will be useful, but without
+# any warranty. See the Mozilla Public License for more details.
+#
+########################################################################
+
+"""
+**Overview**
+
+A module for caching the data parsed from ``vasprun.xml`` file(s) by the :py:mod:`pyhma.vasp_reader` module in a compact binary (``.npz``) file,
+so that repeated analyses of the same files do not need to parse the XML again.
+
+By default, the cache file of ``vasprun.xml`` is a sidecar file (``vasprun.xml.pyhma.npz``) next to it. If a cache directory is given,
+all cache files are stored there instead. A cache file is only used if its key matches the ``vasprun.xml`` file; i.e., the same path,
+size, modification time, content hash, and ``fermi_dirac`` flag. The content hash is computed from the first and last MiB of the file,
+so that checking the key does not require reading the whole file.
+
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+CACHE_VERSION    = 1        # version of the cache file format
+CACHE_SIZE_LIMIT = 10*2**30 # default size limit of all cache files in a directory (bytes)
+_CACHE_SUFFIX    = '.pyhma.npz'
+_HASH_BYTES      = 2**20    # bytes hashed at each end of the file
+_HEADER_KEYS     = ('num_atoms', 'volume', 'box_row_vecs', 'basis', 'force_0', 'ismear', 'timestep', 'temperature')
+_STEPS_KEYS      = ('position', 'force', 'energy', 'pressure')
+
+
+def load(vasprun_file, fermi_dirac=False, cache_dir=None):
+  """
+  Load the cached data of a ``vasprun.xml`` file.
+
+  Parameters
+  -----------
+  vasprun_file : str
+    Path of the ``vasprun.xml`` file.
+  fermi_dirac : bool
+    The ``fermi_dirac`` flag used to read the file. *Default: False*
+  cache_dir : str
+    Cache directory. *Default: None (sidecar file next to vasprun_file)*
+
+  Returns
+  -------
+  data : tuple
+    The header and steps dictionaries of the file (see :py:func:`pyhma.vasp_reader.read`), or None if there is no valid cache file.
+
+  """
+  path = get_path(vasprun_file, cache_dir)
+  try:
+    with np.load(path, allow_pickle=False) as npz:
+      if str(npz['key']) != _get_key(vasprun_file, fermi_dirac):
+        return None
+      header = {k: None for k in _HEADER_KEYS}
+      for k in _HEADER_KEYS:
+        if 'header_'+k in npz.files:
+          v = npz['header_'+k]
+          header[k] = v.item() if v.ndim == 0 else v
+      steps  = {k: npz[k] for k in _STEPS_KEYS}
+  except (OSError, KeyError, ValueError):
+    return None
+  steps['n_complete'] = len(steps['energy'])
+  os.utime(path) # mark as recently used
+  return header, steps
+
+
+def save(vasprun_file, header, steps, fermi_dirac=False, cache_dir=None):
+  """
+  Save the data of a ``vasprun.xml`` file to its cache file.
+
+  Parameters
+  -----------
+  vasprun_file : str
+    Path of the ``vasprun.xml`` file.
+  header : dict
+    Header information of the file.
+  steps : dict
+    Per-step data of the complete steps of the file.
+  fermi_dirac : bool
+    The ``fermi_dirac`` flag used to read the file. *Default: False*
+  cache_dir : str
+    Cache directory. *Default: None (sidecar file next to vasprun_file)*
+
+  """
+  path = get_path(vasprun_file, cache_dir)
+  arrays = {'key': np.array(_get_key(vasprun_file, fermi_dirac))}
+  arrays.update({'header_'+k: np.asarray(v) for k, v in header.items() if v is not None})
+  n = steps['n_complete']
+  arrays.update({k: steps[k][0:n] for k in _STEPS_KEYS})
+  # write to a temporary file first, so that an interrupted write never leaves a broken cache file
+  fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+  try:
+    with os.fdopen(fd, 'wb') as f:
+      np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+  except BaseException:
+    os.remove(tmp_path)
+    raise
+
+
+def clear(vasprun_files, cache_dir=None):
+  """
+  Invalidate (remove) the cache files of the given ``vasprun.xml`` files.
+
+  Parameters
+  -----------
+  vasprun_files : list
+    List of vasprun.xml files.
+  cache_dir : str
+    Cache directory. *Default: None (sidecar files next to vasprun_files)*
+
+  """
+  for vasprun_file in vasprun_files:
+    path = get_path(vasprun_file, cache_dir)
+    if os.path.exists(path):
+      os.remove(path)
+
+
+def evict(directory, size_limit=CACHE_SIZE_LIMIT):
+  """
+  Remove the least recently used cache files in a directory until their total size is within the size limit.
+
+  Parameters
+  -----------
+  directory : str
+    Directory of the cache files.
+  size_limit : int
+    Maximum total size (bytes) of the cache files in the directory. *Default: CACHE_SIZE_LIMIT (10 GiB)*
+
+  """
+  entries = []
+  for entry in os.scandir(directory or '.'):
+    if entry.is_file() and entry.name.endswith(_CACHE_SUFFIX):
+      stat = entry.stat()
+      entries.append((stat.st_mtime, stat.st_size, entry.path))
+  total = sum(size for mtime, size, path in entries)
+  for mtime, size, path in sorted(entries): # oldest first
+    if total <= size_limit:
+      break
+    os.remove(path)
+    total -= size
+
+
+def get_path(vasprun_file, cache_dir=None):
+  """
+  Return the path of the cache file of a ``vasprun.xml`` file.
+
+  Parameters
+  -----------
+  vasprun_file : str
+    Path of the ``vasprun.xml`` file.
+  cache_dir : str
+    Cache directory. *Default: None (sidecar file next to vasprun_file)*
+
+  """
+  if cache_dir is None:
+    return vasprun_file + _CACHE_SUFFIX
+  abs_path = os.path.abspath(vasprun_file)
+  digest = hashlib.sha1(abs_path.encode()).hexdigest()[0:12]
+  return os.path.join(cache_dir, os.path.basename(vasprun_file) + '-' + digest + _CACHE_SUFFIX)
+
+
+def _get_key(vasprun_file, fermi_dirac):
+  """
+  Return the cache key of a ``vasprun.xml`` file: its path, size, modification time, content hash, and the fermi_dirac flag.
+
+  """
+  stat = os.stat(vasprun_file)
+  content_hash = hashlib.sha256()
+  with open(vasprun_file, 'rb') as f:
+    content_hash.update(f.read(_HASH_BYTES))
+    if stat.st_size > _HASH_BYTES:
+      f.seek(max(_HASH_BYTES, stat.st_size - _HASH_BYTES))
+      content_hash.update(f.read(_HASH_BYTES))
+  return json.dumps({'version': CACHE_VERSION, 'path': os.path.abspath(vasprun_file), 'size': stat.st_size,
+                     'mtime': stat.st_mtime_ns, 'hash': content_hash.hexdigest(), 'fermi_dirac': bool(fermi_dirac)})
@@ -26,6 +26,10 @@ class NearestImage:
   """
   A class to get the nearest image of a displacement (dr), given box edge (raw) vectors (box_row_vecs).
 
+  For orthogonal (cubic, tetragonal, or orthorhombic) boxes, the nearest image is obtained in closed form by
+  rounding the fractional displacement along each edge. Otherwise, the transform vectors of the box are used.
+  The path in use is given by the ``method`` attribute (``'orthogonal'`` or ``'transform_vecs'``).
+
   Parameters
   -----------
   box_row_vecs : numpy.ndarray
@@ -37,9 +41,35 @@ class NearestImage:
     self.D = 3
     self.halfTol = 0.50000001
     self.tV2 = {}
-    self.box_row_vecs = box_row_vecs 
-    self.transform_vecs = box_row_vecs
-    self.get_transform_vecs(box_row_vecs)
+    self.box_row_vecs = np.array(box_row_vecs, dtype=float)
+    self.transform_vecs = self.box_row_vecs
+    self.get_transform_vecs(self.box_row_vecs)
+    self.box_vecs2 = np.einsum('ij,ij->i', self.box_row_vecs, self.box_row_vecs)
+    if NearestImage.is_orthogonal(self.box_row_vecs):
+      self.method = 'orthogonal'
+    else:
+      self.method = 'transform_vecs'
+
+  # Box type
+  @staticmethod
+  def is_orthogonal(box_row_vecs):
+    """
+    Check if the box edge (row) vectors are mutually orthogonal.
+
+    The same tolerance used to build the transform vectors is used here; i.e., an orthogonal box has no transform vectors other than its edges.
+
+    Parameters
+    ----------
+    box_row_vecs : numpy.ndarray
+      Box edge (row) vectors in Å.
+
+    """
+    box_row_vecs = np.asarray(box_row_vecs)
+    for i in range(len(box_row_vecs)-1):
+      for k in range(i+1,len(box_row_vecs)):
+        if abs(box_row_vecs[i].dot(box_row_vecs[k])) >= 1e-10:
+          return False
+    return True
 
   # Nearest Image 
   def get_nearest_image(self, dr):
@@ -52,6 +82,10 @@ class NearestImage:
       Atomic displacement from lattice site. Will be modified to the nearest image after calling this method. 
 
     """
+    if self.method == 'orthogonal':
+      dr -= self._get_shifts(dr).dot(self.box_row_vecs)
+      return
+
     # pretend that we last transformed the last+1 vector
     # this has the effect we want
     lastTransform = len(self.transform_vecs)
@@ -72,6 +106,77 @@ class NearestImage:
       i += 1
 
 
+  # Nearest Image (batched)
+  def get_nearest_images(self, dr, return_counts=False):
+    """
+    Modify an array of displacements (dr) to their nearest images.
+
+    For orthogonal boxes, all displacements are wrapped at once in fractional coordinates. Otherwise, this applies the same sequence
+    of transform-vector reductions as :py:meth:`get_nearest_image` to every displacement at once, using masks to track which
+    displacements are still being reduced.
+
+    Parameters
+    ----------
+    dr : numpy.ndarray
+      Array of atomic displacements with shape (N, 3) or (steps, atoms, 3). Will be modified to the nearest images after calling this method.
+    return_counts : bool
+      If True, also return the number of image transformations applied to each displacement. *Default: False*
+
+    Returns
+    -------
+    dr : numpy.ndarray
+      The displacements modified to their nearest images (same array as the input).
+    counts : numpy.ndarray
+      Number of image transformations applied to each displacement, with shape dr.shape[:-1] (only if return_counts=True).
+
+    """
+    dr_flat = dr.reshape(-1,self.D) # a view, unless dr is not contiguous
+    if self.method == 'orthogonal':
+      shifts = self._get_shifts(dr_flat)
+      dr_flat -= shifts.dot(self.box_row_vecs)
+      counts = np.count_nonzero(shifts, axis=1)
+    else:
+      counts = self._reduce_transform_vecs(dr_flat)
+
+    if not np.shares_memory(dr_flat, dr):
+      dr[...] = dr_flat.reshape(dr.shape)
+    if return_counts:
+      return dr, counts.reshape(dr.shape[:-1])
+    return dr
+
+
+  # number of box edges to be subtracted from displacement(s) dr along each edge (orthogonal boxes only)
+  def _get_shifts(self, dr):
+    frac = dr.dot(self.box_row_vecs.T)/self.box_vecs2 # fractional displacements
+    return np.where(np.abs(frac) > self.halfTol, np.round(frac), 0.0)
+
+  # reduce (N, 3) displacements using the transform vectors; returns number of transformations of each
+  def _reduce_transform_vecs(self, dr):
+    len_transform_vecs = len(self.transform_vecs)
+    counts = np.zeros(len(dr), dtype=int)
+    # index of the last transform vector used for each displacement (-1: none yet)
+    lastTransform = np.full(len(dr), -1)
+    active = np.arange(len(dr))
+    t = 0
+    while len(active) > 0:
+      i = t % len_transform_vecs
+      dot = dr[active].dot(self.transform_vecs[i])/self.tV2[i]
+      moved = np.abs(dot) > self.halfTol
+      if moved.any():
+        idx = active[moved]
+        dr[idx] -= np.round(dot[moved])[:,None]*self.transform_vecs[i]
+        lastTransform[idx] = i
+        counts[idx] += 1
+      t += 1
+      # a displacement is done after a full pass without transformation, or
+      # once we get back to the vector it was last transformed with
+      i = t % len_transform_vecs
+      last = lastTransform[active]
+      done = (last == i) | ((last == -1) & (t >= len_transform_vecs))
+      active = active[~done]
+    return counts
+
+
   # Transform Vectors
   def get_transform_vecs(self, box_row_vecs):
     """
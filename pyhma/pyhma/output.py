@@ -0,0 +1,180 @@
+########################################################################
+# pyHMA: A Python Library for HMA
+#
+# Copyright (c) 2020 University at Buffalo
+#
+# Authors: Sabry Moustafa, Andrew Schultz, and David Kofke
+#
+# pyHMA is free software: you can modify and/or redistribute it under
+# the terms of the Mozilla Public License.
+#
+# pyHMA is distributed in the hope that it will be useful, but without
+# any warranty. See the Mozilla Public License for more details.
+#
+########################################################################
+
+"""
+**Overview**
+
+A module for writing the instantaneous anharmonic properties (``energy_ah`` and ``pressure_ah``), in a text or a binary format.
+
+The binary format (``.bin``) is a fixed-size header (``HEADER_SIZE`` bytes: the ``MAGIC`` bytes followed by JSON metadata,
+padded with spaces), followed by the rows (time, Conv, and HMA) as little-endian float64 numbers. Since the data starts at
+a page-aligned offset and has no trailing information, the file can be memory-mapped (see :py:func:`load`), and rows can be
+appended in chunks; the number of rows is given by the file size.
+
+Example
+--------
+
+.. code-block:: python
+
+  >>> data, metadata = pyhma.output.load('energy_ah.bin')
+  >>> time, e_ah_conv, e_ah_hma = data.T
+
+"""
+
+import json
+import numpy as np
+
+MAGIC       = b'PYHMAOUT'
+HEADER_SIZE = 4096        # bytes (page-aligned data)
+VERSION     = 1           # version of the binary format
+_DTYPE      = np.dtype('<f8')
+_TEXT_VALUES = 2**16      # (approximate) number of values formatted together by the text writer
+
+
+class BinaryWriter:
+  """
+  Writer of a binary output file, with chunked appends.
+
+  Parameters
+  -----------
+  path : str
+    Path of the output file.
+  metadata : dict
+    Metadata saved in the header (JSON serializable). It must contain ``columns``, the list of column names.
+  append : bool
+    If True and the file exists, append to it (the metadata of the file is kept). *Default: False*
+
+  Example
+  --------
+
+  .. code-block:: python
+
+    >>> with pyhma.output.BinaryWriter('energy_ah.bin', {'columns': ['time', 'Conv', 'HMA']}) as writer:
+    ...   writer.append(rows) # rows of shape (steps, 3)
+
+  """
+
+  def __init__(self, path, metadata=None, append=False):
+    self.path = path
+    if append:
+      try:
+        self.metadata, self.rows = _read_header(path)
+        self._file = open(path, 'r+b')
+        self._file.seek(HEADER_SIZE + self.rows*len(self.metadata['columns'])*_DTYPE.itemsize) # drop a partial row
+        self._file.truncate()
+        return
+      except FileNotFoundError:
+        pass
+    self.metadata = dict(metadata, version=VERSION)
+    self.rows = 0
+    header = MAGIC + json.dumps(self.metadata).encode()
+    if len(header) >= HEADER_SIZE:
+      raise RuntimeError('Too large metadata of binary output.')
+    self._file = open(path, 'wb')
+    self._file.write(header + b' '*(HEADER_SIZE - len(header) - 1) + b'\n')
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def append(self, rows):
+    """
+    Append rows at the end of the file.
+
+    Parameters
+    ----------
+    rows : numpy.ndarray
+      Rows with shape (n, columns).
+
+    """
+    rows = np.ascontiguousarray(rows, dtype=_DTYPE).reshape(-1, len(self.metadata['columns']))
+    self._file.write(rows.tobytes())
+    self._file.flush()
+    self.rows += len(rows)
+
+  def close(self):
+    """ Close the file. """
+    self._file.close()
+
+
+def load(path, mmap=True):
+  """
+  Load a binary output file.
+
+  Parameters
+  -----------
+  path : str
+    Path of the output file.
+  mmap : bool
+    If True, the data is memory-mapped (read-only) rather than read into memory. *Default: True*
+
+  Returns
+  -------
+  data : numpy.ndarray
+    Data array with shape (rows, columns).
+  metadata : dict
+    Metadata of the file.
+
+  """
+  metadata, rows = _read_header(path)
+  shape = (rows, len(metadata['columns']))
+  if rows == 0:
+    return np.empty(shape, dtype=_DTYPE), metadata
+  if mmap:
+    return np.memmap(path, dtype=_DTYPE, mode='r', offset=HEADER_SIZE, shape=shape), metadata
+  with open(path, 'rb') as f:
+    f.seek(HEADER_SIZE)
+    return np.fromfile(f, dtype=_DTYPE, count=shape[0]*shape[1]).reshape(shape), metadata
+
+
+def write_text(file, rows, fmt='%10.1f  %10.5f  %10.5f'):
+  """
+  Write rows to a text file, one formatted line (or group of lines) per row. The rows are formatted and written in
+  large chunks rather than line by line.
+
+  Parameters
+  -----------
+  file : str or file
+    Path of the output file, or an open (text) file to write to.
+  rows : numpy.ndarray
+    Rows with shape (n, columns).
+  fmt : str
+    Format of each row (it may contain newlines). *Default: '%10.1f  %10.5f  %10.5f'*
+
+  """
+  if isinstance(file, str):
+    with open(file, 'w') as f:
+      write_text(f, rows, fmt)
+    return
+  rows = np.asarray(rows)
+  line = fmt + '\n'
+  chunk_rows = max(1, _TEXT_VALUES//max(1, rows[0:1].size))
+  for start in range(0, len(rows), chunk_rows):
+    chunk = rows[start:start+chunk_rows]
+    file.write((line*len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+# metadata and number of (complete) rows of a binary output file
+def _read_header(path):
+  with open(path, 'rb') as f:
+    header = f.read(HEADER_SIZE)
+    size = f.seek(0, 2)
+  if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+    raise RuntimeError('Illegal binary output file: ' + path)
+  metadata = json.loads(header[len(MAGIC):].decode())
+  rows = (size - HEADER_SIZE)//(len(metadata['columns'])*_DTYPE.itemsize)
+  return metadata, rows
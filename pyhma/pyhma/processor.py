@@ -20,9 +20,17 @@ A module for processing the ``data`` obtained from the :py:mod:`pyhma.vasp_reade
 
 """
 
+import os
+import mmap
+import multiprocessing
+from multiprocessing import shared_memory
 import numpy as np
 import pyhma
 from pyhma.nearest_image import NearestImage
+from pyhma.array_buffer  import ArrayBuffer
+from pyhma.running_stats import RunningStats
+from pyhma import resampling
+from pyhma import output
 
 class Processor:
   """
@@ -31,11 +39,16 @@ class Processor:
   Parameters
   ----------
   data : dict
-    A dictionary of simulation data extracted from ``vasprun.xml`` file(s) (see, :py:mod:`pyhma.vasp_reader`)
+    A dictionary of simulation data extracted from ``vasprun.xml`` file(s) (see, :py:mod:`pyhma.vasp_reader`).
+    NumPy arrays (including memory-mapped arrays, see :py:mod:`pyhma.trajectory`) are used without copying.
   pressure_qh : float
     Quasiharmonic pressure (GPa)
   meV : bool
     If True, use meV/atom, otherwise use eV/atom. *Default: False*
+  dtype : numpy.dtype
+    If given, data type of the stored position and force arrays (e.g., numpy.float32, to halve their memory). They are
+    converted to float64, one chunk of MD steps at a time, to compute F.dr; all sums and averages are computed in
+    float64. *Default: None (the arrays of data are used as they are)*
 
   Example
   --------
@@ -47,7 +60,7 @@ class Processor:
 
   """
 
-  def __init__(self, data, pressure_qh, meV=False):
+  def __init__(self, data, pressure_qh, meV=False, dtype=None):
     self.temperature   = data['temperature']            # set temperature (K)
     self.ismear        = data['ismear']                 # Smearing method
     self.timestep      = data['timestep']               # MD timestep size (fs)
@@ -55,16 +68,67 @@ class Processor:
     self.volume_atom   = data['volume_atom']            # specific volume (A^3/atom)
     self.box_row_vecs  = np.array(data['box_row_vecs']) # box edge (raw) vectors (A)
     self.basis         = np.array(data['basis'])        # atomic positions of initial configuration (fractional)
-    self.position     = np.array(data['position'])      # positions at each atom at each MD step (fractional)
-    self.force        = np.array(data['force'])         # forces at each atom at each MD step (eV/A)
-    self.energy      = np.array(data['energy'])         # instantaneous potential energy (eV/atom)
+    self.position     = np.asanyarray(data['position']) # positions at each atom at each MD step (fractional)
+    self.force        = np.asanyarray(data['force'])    # forces at each atom at each MD step (eV/A)
+    self.energy      = np.asanyarray(data['energy'])    # instantaneous potential energy (eV/atom)
+    if dtype is not None:
+      self.position   = self.position.astype(dtype, copy=False)
+      self.force      = self.force.astype(dtype, copy=False)
     self.pressure = data['pressure']                    # instantaneous pressure  (GPa)
     self.pressure_ig = data['pressure_ig']              # ideal gas pressure (GPa)
+    self._raw_data     = ArrayBuffer((3,))              # raw data array of processed steps ([energy, pressure, fdr])
+    self._out_data     = ArrayBuffer((4,))              # anharmonic data array ([e_ah_conv, e_ah_hma, p_ah_conv, p_ah_hma])
+    self._out_data_ok  = True                           # False if out_data must be derived again from raw_data
     self.pressure_qh   = pressure_qh                    # quasiharmonic pressure HMA parameter (GPa)
-    self.out_data      = np.empty((0,4))                # anharmonic data array ([e_ah_conv, e_ah_hma, p_ah_conv, p_ah_hma])
     self.meV           = meV
+    self.steps_tot     = 0                              # number of processed MD steps
+    self.running_stats = None                           # running statistics (see init_running_stats)
+
+  @property
+  def out_data(self):
+    """
+    Anharmonic data array of shape (steps, 4): [e_ah_conv, e_ah_hma, p_ah_conv, p_ah_hma].
+    It is derived from ``raw_data`` when first needed after processing or after changing ``pressure_qh`` or ``meV``.
+    """
+    if not self._out_data_ok and len(self._raw_data) > 0:
+      raw_data = self._raw_data.data
+      self._out_data.clear()
+      self._out_data.append(self._get_out_data(raw_data[:,0], raw_data[:,1], raw_data[:,2]))
+    self._out_data_ok = True
+    return self._out_data.data
+
+  @out_data.setter
+  def out_data(self, out_data):
+    self._out_data.clear()
+    self._out_data.append(np.reshape(out_data, (-1,4)))
+    self._out_data_ok = True
+
+  @property
+  def raw_data(self):
+    """ Raw data array of the processed steps, of shape (steps, 3): [energy (eV/atom), pressure (GPa), F.dr (eV)]. """
+    return self._raw_data.data
+
+  @property
+  def pressure_qh(self):
+    """ Quasiharmonic pressure (GPa). Changing it does not require processing the MD steps again. """
+    return self._pressure_qh
+
+  @pressure_qh.setter
+  def pressure_qh(self, pressure_qh):
+    self._pressure_qh = pressure_qh
+    self._out_data_ok = False
+
+  @property
+  def meV(self):
+    """ If True, use meV/atom, otherwise use eV/atom. Changing it does not require processing the MD steps again. """
+    return self._meV
+
+  @meV.setter
+  def meV(self, meV):
+    self._meV = meV
+    self._out_data_ok = False
     
-  def process(self, steps_tot=None, verbose=False):
+  def process(self, steps_tot=None, verbose=False, workers=1, binary_output=False, output_dir='.'):
     """ 
     Compute instantaneous anharmonic properties.
 
@@ -74,6 +138,13 @@ class Processor:
       Total number of MD steps to be used. *Default: steps found in vasprun.xml*.
     verbose : bool  
       If True, print simulation information while running. *Default: False*.
+    workers : int
+      Number of processes used to compute the HMA sums. The MD steps are split in chunks that are processed in a
+      process pool, with positions and forces shared through shared memory. *Default: 1 (serial)*.
+    binary_output : bool
+      If True, write binary (``.bin``) output files instead of text (``.out``) files. *Default: False*.
+    output_dir : str
+      Directory of the output files. *Default: '.'*
 
 
     The method also generates the following files:
@@ -81,7 +152,13 @@ class Processor:
       * **energy_ah.out**: anharmonic energy (eV/atom; or meV/atom if meV=True)  
       * **pressure_ah.out**: anharmonic pressure (GPa)
 
-    Each file contains three columns; time (in fs), Conv, and HMA estimates of the property.
+    Each file contains three columns; time (in fs), Conv, and HMA estimates of the property. With ``binary_output=True``,
+    the files are **energy_ah.bin** and **pressure_ah.bin**, in the memory-mappable format of :py:mod:`pyhma.output`
+    (full precision, with a metadata header).
+
+    The energy, pressure, and F.dr of each step are kept in ``raw_data``, from which ``out_data`` is derived; so,
+    ``pressure_qh`` and ``meV`` can be changed later (e.g., ``proc.pressure_qh = 5.0``) without calling this method again
+    (use :py:meth:`write_output` to update the files).
    
     Example
     --------
@@ -104,6 +181,7 @@ class Processor:
           Using 10000  user-set MD steps
   
           Computing instantaneous properties ...
+          Nearest image method: orthogonal
   
     """
   
@@ -117,14 +195,10 @@ class Processor:
         raise RuntimeError('Illegal total number of steps.')
 
     kB = 0.0000861733063733830                            # Boltzmann's constant (eV/K)
-    eV2J = 1.602176634e-19                                # eV to Joules conversion factor
     kBT_eV = kB*self.temperature                          # eV
-    kBT_J  = kBT_eV*eV2J                                  # J
-    f_v = (self.pressure_qh-self.pressure_ig) \
-          /(3*(self.num_atoms-1)*kBT_J)                   # f_v variable HMA pressure (GPa/J)
 
-    energy_lat   = self.energy[0]
-    pressure_lat = self.pressure[0] - self.pressure_ig
+    self.energy_lat   = energy_lat   = self.energy[0]
+    self.pressure_lat = pressure_lat = self.pressure[0] - self.pressure_ig
     if verbose:
       print('\nSimulation data')
       print('===============')
@@ -145,33 +219,221 @@ class Processor:
       print('\n Computing instantaneous properties ...')
  
     basis_cart = Processor._direct_to_cart(self.basis, self.box_row_vecs)
+    self._nearest_image = NearestImage(self.box_row_vecs)
+    if verbose:
+      print(' Nearest image method: %s' % self._nearest_image.method)
+    self._raw_data.clear()
+    self._raw_data.reserve(self.steps_tot)
+    for start, stop, fdr in self._iter_fdr(basis_cart, workers): # blocks of snaps
+      self._raw_data.append(np.column_stack((self.energy[start:stop], self.pressure[start:stop], fdr)))
+    self._out_data_ok = False
+
+    self.write_output(binary=binary_output, output_dir=output_dir)
+
+
+  def write_output(self, binary=False, output_dir='.'):
+    """
+    Write the anharmonic properties of the processed steps to ``energy_ah.out`` and ``pressure_ah.out``, or to
+    ``energy_ah.bin`` and ``pressure_ah.bin`` if binary is True (see :py:meth:`process`).
+
+    Parameters
+    ----------
+    binary : bool
+      If True, write binary files (see :py:mod:`pyhma.output`). *Default: False*.
+    output_dir : str
+      Directory of the output files. *Default: '.'*
+
+    """
+    sim_time = np.arange(len(self.out_data))*self.timestep
+    if not binary:
+      output.write_text(os.path.join(output_dir, 'energy_ah.out'), np.column_stack((sim_time, self.out_data[:,0:2])))
+      output.write_text(os.path.join(output_dir, 'pressure_ah.out'), np.column_stack((sim_time, self.out_data[:,2:4])))
+      return
+
+    e_units = 'meV/atom' if self.meV else 'eV/atom'
+    metadata = {'columns': ['time', 'Conv', 'HMA'], 'time_units': 'fs', 'timestep': float(self.timestep),\
+                'temperature': float(self.temperature), 'volume_atom': float(self.volume_atom),\
+                'num_atoms': int(self.num_atoms), 'pressure_qh': float(self.pressure_qh)}
+    with output.BinaryWriter(os.path.join(output_dir, 'energy_ah.bin'), dict(metadata, property='energy_ah', units=e_units)) as energy_writer,\
+         output.BinaryWriter(os.path.join(output_dir, 'pressure_ah.bin'), dict(metadata, property='pressure_ah', units='GPa')) as pressure_writer:
+      chunk = 2**16 # bulk writes of bounded temporary arrays
+      for start in range(0, len(self.out_data), chunk):
+        out_data = self.out_data[start:start+chunk]
+        energy_writer.append(np.column_stack((sim_time[start:start+chunk], out_data[:,0:2])))
+        pressure_writer.append(np.column_stack((sim_time[start:start+chunk], out_data[:,2:4])))
+
+
+  def init_running_stats(self, steps_eq, blocksize, keep_out_data=True):
+    """
+    Start running (online) statistics, updated as new MD steps are added with :py:meth:`update`.
+    Steps that were already processed are included. The statistics use the ``pressure_qh`` and ``meV`` values at the time
+    each step is added.
+
+    Parameters
+    ----------
+    steps_eq : int
+      Number of MD steps used for equilibaration
+    blocksize : int
+      Number of MD steps in each block used for block averaging
+    keep_out_data : bool
+      If False, the new steps are not stored in ``raw_data`` and ``out_data``, so that memory does not grow with the number
+      of steps (:py:meth:`get_stats` can then not be used). *Default: True*
+
+    """
+    self.running_stats = RunningStats(steps_eq, blocksize)
+    self.running_stats.add(self.out_data[0:self.steps_tot])
+    self._keep_out_data = keep_out_data
+
+
+  def update(self, position, force, energy, pressure):
+    """
+    Add a batch of new MD steps, compute their instantaneous anharmonic properties, and update the running statistics.
+    If no step was processed before, the energy and pressure of the lattice are taken from the first step of ``data``
+    (or of the batch, if ``data`` has no steps).
+
+    Parameters
+    ----------
+    position : numpy.ndarray
+      Atomic fractional positions with shape (steps, atoms, 3).
+    force : numpy.ndarray
+      Atomic forces (eV/A) with shape (steps, atoms, 3).
+    energy : numpy.ndarray
+      Potential energy (eV/atom) at each step.
+    pressure : numpy.ndarray
+      Pressure (GPa), including the ideal gas contribution, at each step.
+
+    Returns
+    -------
+    out_data : numpy.ndarray
+      Anharmonic data of the new steps with shape (steps, 4): [e_ah_conv, e_ah_hma, p_ah_conv, p_ah_hma].
+
+    Example
+    --------
+
+    .. code-block:: python
+
+      >>> proc.init_running_stats(steps_eq=1000, blocksize=90, keep_out_data=False)
+      >>> reader = pyhma.LiveReader(['vasprun.xml'])
+      >>> batch, data = reader.poll()
+      >>> proc.update(batch['position'], batch['force'], batch['energy'], batch['pressure'])
+      >>> stats = proc.get_running_stats()
+
+    """
+    if self.running_stats is None:
+      print('WARNING! Running statistics are not initialized.')
+      print('         Call init_running_stats first and try again.')
+      raise RuntimeError('Uninitialized running statistics.')
+    energy   = np.asarray(energy)
+    pressure = np.asarray(pressure)
+    if len(energy) == 0:
+      return np.empty((0,4))
+    if self.steps_tot == 0: # lattice from the initial configuration
+      self.energy_lat   = self.energy[0] if len(self.energy) > 0 else energy[0]
+      self.pressure_lat = (self.pressure[0] if len(self.pressure) > 0 else pressure[0]) - self.pressure_ig
+    if not hasattr(self, '_nearest_image'):
+      self._nearest_image = NearestImage(self.box_row_vecs)
+    basis_cart = Processor._direct_to_cart(self.basis, self.box_row_vecs)
+    position = np.asarray(position)
+    force    = np.asarray(force)
+    chunk = Processor._get_chunk_steps(self.num_atoms)
+    fdr = np.empty(len(energy))
+    for start in range(0, len(energy), chunk):
+      stop = min(start+chunk, len(energy))
+      fdr[start:stop] = Processor._get_fdr(position[start:stop], force[start:stop], basis_cart, self.box_row_vecs,\
+                                           self._nearest_image)
+    out_data = self._get_out_data(energy, pressure, fdr)
+    if self._keep_out_data:
+      if self._out_data_ok: # otherwise, out_data is derived later from raw_data
+        self._out_data.append(out_data)
+      self._raw_data.append(np.column_stack((energy, pressure, fdr)))
+    self.running_stats.add(out_data)
+    self.steps_tot += len(energy)
+    return out_data
+
+
+  def get_running_stats(self):
+    """
+    Return the running statistics of all the steps added so far (see :py:meth:`init_running_stats`), in the same format
+    as :py:meth:`get_stats`. The cost does not depend on the number of steps. The uncertainty and correlation are NaN
+    until two blocks are complete.
+
+    Return
+    -------
+    stats : dict
+      A dictionary of output statistics of anharmonic energy and pressure (using Conv and HMA)
+
+    """
+    if self.running_stats is None:
+      print('WARNING! Running statistics are not initialized.')
+      print('         Call init_running_stats first and try again.')
+      raise RuntimeError('Uninitialized running statistics.')
+    data_avg, data_err, data_cor = self.running_stats.get_stats()
+    self.stats = {'e_ah_conv': {'avg': data_avg[0] , 'err': data_err[0] , 'cor': data_cor[0]},\
+                      'e_ah_hma' : {'avg': data_avg[1] , 'err': data_err[1] , 'cor': data_cor[1]}, \
+                      'p_ah_conv': {'avg': data_avg[2] , 'err': data_err[2] , 'cor': data_cor[2]}, \
+                      'p_ah_hma' : {'avg': data_avg[3] , 'err': data_err[3] , 'cor': data_cor[3]}}
+    return self.stats
+
+
+  # anharmonic data ([e_ah_conv, e_ah_hma, p_ah_conv, p_ah_hma]) of MD steps from their energy, pressure, and F.dr
+  def _get_out_data(self, energy, pressure, fdr):
+    kB = 0.0000861733063733830                            # Boltzmann's constant (eV/K)
+    eV2J = 1.602176634e-19                                # eV to Joules conversion factor
+    kBT_eV = kB*self.temperature                          # eV
+    kBT_J  = kBT_eV*eV2J                                  # J
+    f_v = (self.pressure_qh-self.pressure_ig) \
+          /(3*(self.num_atoms-1)*kBT_J)                   # f_v variable HMA pressure (GPa/J)
     e_fac = 1.0
     if self.meV:
       e_fac = 1.0e3
-    with open('energy_ah.out','w') as file_energy_ah, open('pressure_ah.out','w') as file_pressure_ah:
-      self._nearest_image = NearestImage(self.box_row_vecs) 
-      for step in range(self.steps_tot): # snaps
-        sim_time = step*self.timestep
-        # Conv
-        e_ah_conv = e_fac*(self.energy[step] - energy_lat - 1.5*kBT_eV*(self.num_atoms-1)/self.num_atoms)
-        p_ah_conv = self.pressure[step] - pressure_lat - self.pressure_qh
-        # HMA
-        r_cart  = Processor._direct_to_cart(self.position[step], self.box_row_vecs)
-        fdr = 0
-        for atom in range(self.num_atoms): # atoms
-          f  = self.force[step][atom]
-          dr = r_cart[atom] - basis_cart[atom]
-          if atom == 0:
-            dr1 = np.copy(dr)
-          dr -= dr1 # reference assigment
-          self._nearest_image.get_nearest_image(dr)
-          fdr = fdr + f.dot(dr)
-
-        e_ah_hma  = e_fac*(self.energy[step] + 0.5*fdr/self.num_atoms - energy_lat)
-        p_ah_hma  = self.pressure[step] - self.pressure_ig + f_v*fdr*eV2J - pressure_lat
-        print('%10.1f  %10.5f  %10.5f' % (sim_time, e_ah_conv, e_ah_hma) , file=file_energy_ah)
-        print('%10.1f  %10.5f  %10.5f' % (sim_time, p_ah_conv, p_ah_hma) , file=file_pressure_ah)
-        self.out_data = np.append(self.out_data , [[e_ah_conv, e_ah_hma, p_ah_conv, p_ah_hma]] , axis=0)
+    pressure = np.array(pressure)
+    # Conv
+    e_ah_conv = e_fac*(energy - self.energy_lat - 1.5*kBT_eV*(self.num_atoms-1)/self.num_atoms)
+    p_ah_conv = pressure - self.pressure_lat - self.pressure_qh
+    # HMA
+    e_ah_hma  = e_fac*(energy + 0.5*fdr/self.num_atoms - self.energy_lat)
+    p_ah_hma  = pressure - self.pressure_ig + f_v*fdr*eV2J - self.pressure_lat
+    return np.column_stack((e_ah_conv, e_ah_hma, p_ah_conv, p_ah_hma))
+
+
+  # F.dr for consecutive blocks of MD steps (start, stop, fdr), computed serially or in a process pool
+  def _iter_fdr(self, basis_cart, workers=1):
+    chunk = Processor._get_chunk_steps(self.num_atoms)
+    if workers <= 1:
+      for start in range(0, self.steps_tot, chunk):
+        stop = min(start+chunk, self.steps_tot)
+        fdr = Processor._get_fdr(self.position[start:stop], self.force[start:stop], basis_cart, self.box_row_vecs,\
+                                 self._nearest_image)
+        Processor._release_pages(self.position, start, stop)
+        Processor._release_pages(self.force, start, stop)
+        yield start, stop, fdr
+      return
+
+    # use smaller chunks if needed to keep all workers busy
+    chunk = max(1, min(chunk, -(-self.steps_tot//(4*workers))))
+    shms = []
+    try:
+      shared = []
+      for array in (self.position, self.force):
+        if Processor._is_mapped_file(array):
+          # memory-mapped file: the workers map the same file, without copying
+          shared.append(('file', array.filename, array.offset, array.shape, array.dtype.str))
+          continue
+        array = array[0:self.steps_tot]
+        shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        shms.append(shm)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        shared.append(('shm', shm.name, 0, array.shape, array.dtype.str))
+      tasks = [(*shared, start, min(start+chunk, self.steps_tot), basis_cart, self.box_row_vecs)\
+               for start in range(0, self.steps_tot, chunk)]
+      with multiprocessing.Pool(workers) as pool:
+        for task, fdr in zip(tasks, pool.imap(_fdr_worker, tasks)): # results in order
+          yield task[2], task[3], fdr
+    finally:
+      for shm in shms:
+        shm.close()
+        shm.unlink()
+
 
 
   # Compute statistics: average (avg), stochastic uncertainty (err), and correlation (cor)
@@ -182,7 +444,8 @@ class Processor:
     Parameters
     ----------
     steps_eq : int
-      Number of MD steps used for equilibaration 
+      Number of MD steps used for equilibaration. If 'auto', it is chosen by :py:meth:`detect_equilibration` and
+      reported in the ``steps_eq`` entry of ``stats``.
     blocksize : int
       Number of MD steps in each block used for block averaging
     verbose : bool 
@@ -209,14 +472,10 @@ class Processor:
 
     """
 
-    if self.steps_tot < steps_eq:
-      print('WARNING! Number of equilibaration steps (', steps_eq,') can not be larger than total steps (', self.steps_tot,').')
-      print('         Reduce steps_eq and try again.')
-      raise RuntimeError('Illegal equilibaration steps.')
-    elif int((self.steps_tot - steps_eq)/blocksize) < 2:
-      print('WARNING! Number of blocks ((steps_tot-steps_eq)/blocksize) must be at least two.')
-      print('         Reduce blocksize to get finite number of blocks and try again.')
-      raise RuntimeError('Illegal block size.') 
+    steps_eq_auto = steps_eq == 'auto'
+    if steps_eq_auto:
+      steps_eq = self.detect_equilibration(verbose=verbose)
+    self._check_steps(steps_eq, blocksize)
 
     n_prod = self.steps_tot - steps_eq
     data_prod = self.out_data[steps_eq:self.steps_tot,:]
@@ -240,9 +499,300 @@ class Processor:
                       'e_ah_hma' : {'avg': data_avg[1] , 'err': data_err[1] , 'cor': data_cor[1]}, \
                       'p_ah_conv': {'avg': data_avg[2] , 'err': data_err[2] , 'cor': data_cor[2]}, \
                       'p_ah_hma' : {'avg': data_avg[3] , 'err': data_err[3] , 'cor': data_cor[3]}}
+    if steps_eq_auto:
+      self.stats['steps_eq'] = steps_eq
     return self.stats
 
 
+  # Resampling (bootstrap or jackknife) statistics of the block averages
+  def get_resampled_stats(self, steps_eq, blocksize, method='bootstrap', func=None, n_samples=1000, seed=0,\
+                          confidence=0.95, workers=1):
+    """
+    Compute resampling uncertainties and confidence intervals of the ensemble averages, or of a quantity derived from
+    them, using the block averages (see :py:mod:`pyhma.resampling`).
+
+    Parameters
+    ----------
+    steps_eq : int
+      Number of MD steps used for equilibaration
+    blocksize : int
+      Number of MD steps in each block used for block averaging
+    method : str
+      Resampling method: 'bootstrap' or 'jackknife'. *Default: 'bootstrap'*
+    func : function
+      Derived quantity ``func(avgs)`` of the averages, with avgs of shape (replicates, 4). *Default: None*
+    n_samples : int
+      Number of bootstrap replicates. *Default: 1000*
+    seed : int
+      Random seed of the bootstrap replicates. *Default: 0*
+    confidence : float
+      Confidence level of the intervals. *Default: 0.95*
+    workers : int
+      Number of processes used to generate the bootstrap replicates. *Default: 1 (serial)*
+
+    Return
+    -------
+    stats : dict
+      If func is None, a dictionary of the average (avg), uncertainty (err), and confidence interval (ci_low and ci_high)
+      of each anharmonic property; otherwise, a dictionary of these entries for the derived quantity.
+
+    Example
+    -------
+
+    .. code-block:: python
+
+       >>> stats = proc.get_resampled_stats(steps_eq=1000, blocksize=90, n_samples=10000)
+       >>> stats['e_ah_hma']['ci_low'], stats['e_ah_hma']['ci_high']
+
+    """
+
+    self._check_steps(steps_eq, blocksize)
+
+    data_prod_block = Processor._block_data(self.out_data[steps_eq:self.steps_tot,:], blocksize)
+    if method == 'bootstrap':
+      res = resampling.bootstrap(data_prod_block, func, n_samples=n_samples, seed=seed, confidence=confidence, workers=workers)
+    elif method == 'jackknife':
+      res = resampling.jackknife(data_prod_block, func, confidence=confidence)
+    else:
+      print('WARNING! Resampling method (', method,') must be bootstrap or jackknife.')
+      raise RuntimeError('Illegal resampling method.')
+
+    if func is not None:
+      return res
+    return {name: {k: res[k][i] for k in ('avg', 'err', 'ci_low', 'ci_high')}\
+            for i, name in enumerate(('e_ah_conv', 'e_ah_hma', 'p_ah_conv', 'p_ah_hma'))}
+
+
+  # Scan block sizes (powers of two) by pairwise reblocking of the production data
+  def scan_blocksizes(self, steps_eq, cor_max=0.2, verbose=False):
+    """
+    Compute the uncertainty and adjacent blocks correlation for a range of block sizes (1, 2, 4, ...) in one pass.
+
+    The block averages of each block size are obtained by averaging adjacent pairs of block averages of the previous
+    (half) block size, so that the whole scan costs O(N) for N production steps. The suggested block size is the
+    smallest one whose correlations (of all four properties) are below ``cor_max``.
+
+    Parameters
+    ----------
+    steps_eq : int
+      Number of MD steps used for equilibaration
+    cor_max : float
+      Correlation threshold used to suggest a block size. *Default: 0.2*
+    verbose : bool
+      If True, the scan table will be printed. *Default: False*
+
+    Return
+    -------
+    scan : dict
+      A dictionary of the scanned block sizes (``blocksize``) and number of blocks (``n_blocks``), the uncertainty
+      (``err``) and correlation (``cor``) arrays of each property (``e_ah_conv``, ``e_ah_hma``, ``p_ah_conv``, and
+      ``p_ah_hma``), and the suggested block size (``blocksize_suggested``; None if no block size satisfies ``cor_max``).
+
+    Example
+    -------
+
+    .. code-block:: python
+
+       >>> scan = proc.scan_blocksizes(steps_eq=1000, verbose=True)
+       >>> stats = proc.get_stats(steps_eq=1000, blocksize=scan['blocksize_suggested'])
+
+    """
+
+    self._check_steps(steps_eq)
+
+    data_block = np.array(self.out_data[steps_eq:self.steps_tot,:])
+    blocksizes, n_blocks, errs, cors = [], [], [], []
+    blocksize = 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+      while len(data_block) >= 2:
+        blocksizes.append(blocksize)
+        n_blocks.append(len(data_block))
+        errs.append(np.std(data_block, ddof = 1, axis=0)/np.sqrt(len(data_block)))
+        cors.append(Processor._get_cor(data_block))
+        n = len(data_block)//2 # a trailing unpaired block is dropped
+        data_block = 0.5*(data_block[0:2*n:2] + data_block[1:2*n:2])
+        blocksize *= 2
+    errs = np.reshape(errs, (-1,4))
+    cors = np.reshape(cors, (-1,4))
+
+    blocksize_suggested = None
+    for i in range(len(blocksizes)):
+      if np.all(cors[i] < cor_max):
+        blocksize_suggested = blocksizes[i]
+        break
+
+    scan = {'blocksize': np.array(blocksizes), 'n_blocks': np.array(n_blocks), 'blocksize_suggested': blocksize_suggested}
+    for i, name in enumerate(('e_ah_conv', 'e_ah_hma', 'p_ah_conv', 'p_ah_hma')):
+      scan[name] = {'err': errs[:,i], 'cor': cors[:,i]}
+
+    if verbose:
+      print('\nBlock size scan')
+      print('===============')
+      print(' blocksize   blocks    e_ah_conv          e_ah_hma           p_ah_conv          p_ah_hma')
+      print('                       err       cor      err       cor      err       cor      err       cor')
+      for i in range(len(blocksizes)):
+        print(' %9d  %7d' % (blocksizes[i], n_blocks[i]) + ''.join('    %7.1e  %5.2f' % (errs[i,j], cors[i,j]) for j in range(4)))
+      if blocksize_suggested is None:
+        print('\n No block size has correlations below %4.2f' % cor_max)
+      else:
+        print('\n Suggested blocksize (correlations below %4.2f): %d' % (cor_max, blocksize_suggested))
+
+    return scan
+
+
+  # Autocorrelation function, integrated autocorrelation time, and statistical inefficiency of each property
+  def get_autocorrelation(self, steps_eq, window_c=5, verbose=False):
+    """
+    Compute the normalized autocorrelation function (ACF) of each property over the production steps using FFT (O(N log N)),
+    and from that the integrated autocorrelation time and the statistical inefficiency.
+
+    The integrated autocorrelation time is :math:`\\tau = 1/2 + \\sum_{t=1}^{M} \\rho(t)` (in MD steps), where the window
+    :math:`M` is the smallest lag with :math:`M \\geq` ``window_c`` :math:`(2\\tau)`. The statistical inefficiency is
+    :math:`g = 2\\tau`, so that N correlated steps are equivalent to N/g uncorrelated samples and the uncertainty of the
+    average is :math:`\\sigma \\sqrt{g/N}`, independent of any block size.
+
+    Parameters
+    ----------
+    steps_eq : int
+      Number of MD steps used for equilibaration
+    window_c : float
+      Window constant of the ACF summation. *Default: 5*
+    verbose : bool
+      If True, the results and the HMA efficiency (number of Conv steps needed per HMA step for the same uncertainty)
+      will be printed. *Default: False*
+
+    Return
+    -------
+    acf_stats : dict
+      A dictionary of the ACF (``acf``), integrated autocorrelation time (``tau``), statistical inefficiency (``g``),
+      and uncertainty (``err``) of each property (``e_ah_conv``, ``e_ah_hma``, ``p_ah_conv``, and ``p_ah_hma``).
+
+    Example
+    -------
+
+    .. code-block:: python
+
+       >>> acf_stats = proc.get_autocorrelation(steps_eq=1000)
+       >>> acf_stats['e_ah_hma']['tau']
+
+    """
+
+    self._check_steps(steps_eq)
+    if self.steps_tot - steps_eq < 2:
+      print('WARNING! Number of production steps (steps_tot-steps_eq) must be at least two.')
+      print('         Reduce steps_eq and try again.')
+      raise RuntimeError('Illegal equilibaration steps.')
+
+    data_prod = self.out_data[steps_eq:self.steps_tot,:]
+    n_prod = len(data_prod)
+    acf = Processor._get_acf(data_prod)
+    acf_stats = {}
+    for i, name in enumerate(('e_ah_conv', 'e_ah_hma', 'p_ah_conv', 'p_ah_hma')):
+      g = Processor._get_inefficiency(acf[:,i], window_c)
+      acf_stats[name] = {'acf': acf[:,i], 'tau': 0.5*g, 'g': g, 'err': np.std(data_prod[:,i])*np.sqrt(g/n_prod)}
+
+    if verbose:
+      print('\nAutocorrelation analysis')
+      print('========================')
+      print('', n_prod, 'production steps (after', steps_eq ,'equilibration steps)\n')
+      print('              tau (steps)        g          err')
+      for name in acf_stats:
+        print(' %-10s   %10.2f  %10.2f    %7.1e' % (name, acf_stats[name]['tau'], acf_stats[name]['g'], acf_stats[name]['err']))
+      print('\n HMA efficiency (Conv/HMA steps for the same uncertainty):  energy %.1f  pressure %.1f'\
+            % ((acf_stats['e_ah_conv']['err']/acf_stats['e_ah_hma']['err'])**2,\
+               (acf_stats['p_ah_conv']['err']/acf_stats['p_ah_hma']['err'])**2))
+
+    return acf_stats
+
+
+  # Automatic equilibration detection: the start step that maximizes the effective number of uncorrelated HMA samples
+  def detect_equilibration(self, n_candidates=100, window_c=5, max_lag=None, verbose=False):
+    """
+    Choose the number of equilibration steps automatically.
+
+    Candidate start steps are taken evenly over the first half of the MD steps. For each candidate, the statistical
+    inefficiency g (see :py:meth:`get_autocorrelation`) of the remaining steps is estimated from prefix sums of the data
+    and of its lagged products, so that all candidates are evaluated together at O(N) cost per lag (and the number of
+    lags is bounded by ``max_lag``). The chosen start
+    maximizes the effective number of uncorrelated samples, (steps_tot - steps_eq)/g, where g is the larger one of the
+    two HMA properties (e_ah_hma and p_ah_hma). Candidates whose summation window is not reached within ``max_lag`` are
+    skipped (with a warning), since their g would be underestimated.
+
+    Parameters
+    ----------
+    n_candidates : int
+      Number of candidate start steps. *Default: 100*
+    window_c : float
+      Window constant of the autocorrelation summation. *Default: 5*
+    max_lag : int
+      Largest lag used to estimate g; the cost is O(N) per lag, and the lags of each candidate stop at its summation
+      window (see :py:meth:`get_autocorrelation`). *Default: 1000, or 1/10 of the MD steps if smaller*
+    verbose : bool
+      If True, the chosen number of equilibration steps will be printed. *Default: False*
+
+    Return
+    -------
+    steps_eq : int
+      Number of MD steps used for equilibaration
+
+    Example
+    -------
+
+    .. code-block:: python
+
+       >>> steps_eq = proc.detect_equilibration()
+       >>> stats = proc.get_stats(steps_eq='auto', blocksize=90) # or, detect and get statistics in one call
+
+    """
+
+    self._check_steps(0)
+    if self.steps_tot < 4:
+      print('WARNING! Number of total steps (', self.steps_tot,') is too small to detect the equilibration.')
+      print('         Set steps_eq and try again.')
+      raise RuntimeError('Illegal total number of steps.')
+    if max_lag is None:
+      max_lag = max(1, min(1000, self.steps_tot//10))
+
+    data = self.out_data[0:self.steps_tot,[1,3]] # HMA properties
+    starts = np.unique(np.linspace(0, self.steps_tot//2, n_candidates).astype(int))
+    g, converged = Processor._get_suffix_inefficiency(data, starts, window_c, max_lag)
+    converged = np.all(converged, axis=1)
+    if not np.any(converged):
+      print('WARNING! The autocorrelation summation of no candidate start step reached its window within max_lag (', max_lag,') steps.')
+      print('         Increase max_lag (or the MD steps), or set steps_eq and try again.')
+      raise RuntimeError('Illegal max_lag.')
+    elif not np.all(converged):
+      print('WARNING! %d of %d candidate start steps are skipped; their autocorrelation summation did not reach its window' \
+            % (np.count_nonzero(~converged), len(starts)))
+      print('         within max_lag (', max_lag,') steps.')
+    n_eff = np.where(converged, (self.steps_tot - starts)/np.max(g, axis=1), -np.inf)
+    steps_eq = int(starts[np.argmax(n_eff)])
+
+    if verbose:
+      print('\nEquilibration detection')
+      print('=======================')
+      print(' Using %d equilibration steps (%.1f effective HMA samples)' % (steps_eq, np.max(n_eff)))
+
+    return steps_eq
+
+
+  # check that the instantaneous properties of all steps are stored, that steps_eq does not exceed the total steps,
+  # and (if blocksize is given) that there are at least two blocks of production steps
+  def _check_steps(self, steps_eq, blocksize=None):
+    if len(self.out_data) < self.steps_tot:
+      print('WARNING! Instantaneous properties of all steps are not stored (keep_out_data=False).')
+      print('         Use get_running_stats instead.')
+      raise RuntimeError('Missing instantaneous properties.')
+    elif self.steps_tot < steps_eq:
+      print('WARNING! Number of equilibaration steps (', steps_eq,') can not be larger than total steps (', self.steps_tot,').')
+      print('         Reduce steps_eq and try again.')
+      raise RuntimeError('Illegal equilibaration steps.')
+    elif blocksize is not None and int((self.steps_tot - steps_eq)/blocksize) < 2:
+      print('WARNING! Number of blocks ((steps_tot-steps_eq)/blocksize) must be at least two.')
+      print('         Reduce blocksize to get finite number of blocks and try again.')
+      raise RuntimeError('Illegal block size.')
+
+
   # print statistics in a user-friendly format
   def print_stats(self, stats):
     """ Print statistics in a user-friendly format
@@ -270,6 +820,9 @@ class Processor:
     if self.meV:
       e_units='meV'
 
+    if 'steps_eq' in stats:
+      print('\n Equilibration steps (auto): %d' % stats['steps_eq'])
+
     print('\n e_ah_conv (%s/atom): %10.5f +/- %5.1e    cor: %4.2f' % (e_units, stats['e_ah_conv']['avg'],\
           stats['e_ah_conv']['err'], stats['e_ah_conv']['cor']))
     print(' e_ah_hma  (%s/atom): %10.5f +/- %5.1e    cor: %4.2f' % (e_units, stats['e_ah_hma']['avg'],\
@@ -286,19 +839,10 @@ class Processor:
   def _block_data(data, blocksize):
     """ block data!!!
     """
-    sum = np.zeros((1,len(data[0])))
-    n = 1  # block number
-    for i in range(len(data)):
-      sum += data[i]
-      if (i+1) % blocksize == 0:
-        block_avg =  sum/blocksize
-        if n == 1: 
-          data_block = block_avg
-        else:
-          data_block = np.append(data_block, block_avg , axis = 0)
-        sum = np.zeros((1,len(data[0])))
-        n+=1
-    return data_block
+    n_blocks = len(data)//blocksize
+    data = np.asarray(data, dtype=float)[0:n_blocks*blocksize] # trailing partial block is dropped
+    # the sum over the (non-contiguous) blocksize axis adds the steps of each block in order
+    return data.reshape(n_blocks, blocksize, -1).sum(axis=1)/blocksize
 
 
 
@@ -307,21 +851,163 @@ class Processor:
   def _get_cor(data):  # without the N-1 correction in both numerators and denominators
     data_avg = np.average(data, axis=0)
     data_var = np.var(data, ddof = 0, axis=0) # using N, not N-1
-    sum = np.zeros(len(data[0]))
-    for i in range(len(data)-1): # 0,1,... n-2
-      sum += (data[i]-data_avg)*(data[i+1]-data_avg)
+    data_dev = data - data_avg
+    sum = np.sum(data_dev[0:-1]*data_dev[1:], axis=0) # i = 0,1,... n-2 (added in order)
     sum *= 1/(len(data)-1)
     cor = sum/data_var
     return cor
 
 
 
+  # normalized autocorrelation function of each column (lags 0, 1, ... N-1), using FFT
+  @staticmethod
+  def _get_acf(data):
+    n = len(data)
+    data_dev = data - np.average(data, axis=0)
+    n_fft = 1 << (2*n-1).bit_length() # zero padding to at least 2N avoids circular (wrap-around) terms
+    data_fft = np.fft.rfft(data_dev, n=n_fft, axis=0)
+    acf = np.fft.irfft(data_fft*np.conj(data_fft), n=n_fft, axis=0)[0:n]
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return acf/acf[0]
+
+
+
+  # statistical inefficiency g = 1 + 2 sum_t acf(t), summed up to the smallest window M >= window_c*g(M)
+  @staticmethod
+  def _get_inefficiency(acf, window_c=5):
+    g = 2*np.cumsum(acf) - 1 # g(M) for M = 0, 1, ...
+    windows = np.nonzero(np.arange(len(g)) >= window_c*g)[0]
+    if len(windows) == 0:
+      return g[-1]
+    return g[windows[0]]
+
+
+
+  # statistical inefficiency of each column of data[start:] for each (increasing) start, from prefix sums of the data
+  # and segment sums of its lagged products; also returns whether the summation window was reached within max_lag
+  # (if not, g is truncated)
+  @staticmethod
+  def _get_suffix_inefficiency(data, starts, window_c=5, max_lag=None):
+    n = len(data)
+    max_lag = n - 1 - starts[-1] if max_lag is None else min(max_lag, n - 1 - starts[-1]) # so that start < n-lag
+    data = np.ascontiguousarray((data - np.average(data, axis=0)).T) # (columns, steps), shifted for numerical accuracy
+    prefix = np.concatenate((np.zeros((len(data), 1)), np.cumsum(data, axis=1)), axis=1).T # prefix[i] = sum of data[:,0:i]
+    n_suffix = (n - starts)[:,None]
+    avg = (prefix[n] - prefix[starts])/n_suffix                   # average of data[start:]
+
+    # lag-t autocovariance of data[start:] (N denominator, as in _get_acf)
+    def get_cov(t):
+      sum_segments = np.add.reduceat(data[:,0:n-t]*data[:,t:n], starts, axis=1).T # products in [starts[k], starts[k+1])
+      sum_prod = np.cumsum(sum_segments[::-1], axis=0)[::-1]      # data[i]*data[i+t] for i in [start, n-t)
+      sum_head = prefix[n-t] - prefix[starts]                     # data[start:n-t]
+      sum_tail = prefix[n] - prefix[starts + t]                   # data[start+t:n]
+      return (sum_prod - avg*(sum_head + sum_tail) + (n - t - starts)[:,None]*avg**2)/n_suffix
+
+    # g(M) = 1 + 2 sum_{t<=M} acf(t), until M >= window_c*g(M) (as in _get_inefficiency)
+    cov_0 = get_cov(0)
+    g = np.ones(cov_0.shape)
+    done = np.zeros(cov_0.shape, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      for t in range(1, max_lag+1):
+        g = np.where(done, g, g + 2*get_cov(t)/cov_0)
+        done |= t >= window_c*g
+        if np.all(done):
+          break
+    return g, done
+
+
+
+  # True if array is a whole read-only memory-mapped file array (e.g., from numpy.load(..., mmap_mode='r')); other maps
+  # (e.g., copy-on-write, mode 'c') may hold edits that are not in the file, so they are used as in-memory arrays
+  @staticmethod
+  def _is_mapped_file(array):
+    return isinstance(array, np.memmap) and array.mode == 'r' and isinstance(array.base, mmap.mmap) and array.flags.c_contiguous
+
+
+
+  # drop the pages of MD steps [start, stop) of a memory-mapped file array from memory (they are read again if needed),
+  # so that memory stays close to one chunk of MD steps
+  @staticmethod
+  def _release_pages(array, start, stop):
+    if not Processor._is_mapped_file(array) or not hasattr(mmap, 'MADV_DONTNEED'):
+      return
+    step_bytes = array.strides[0]
+    begin = array.offset % mmap.ALLOCATIONGRANULARITY + start*step_bytes # position in the mapped memory
+    end   = array.offset % mmap.ALLOCATIONGRANULARITY + stop*step_bytes
+    begin -= begin % mmap.PAGESIZE
+    array.base.madvise(mmap.MADV_DONTNEED, begin, end - begin)
+
+
+
+  # number of MD steps processed together, so that temporary (steps, atoms, 3) arrays stay small
+  @staticmethod
+  def _get_chunk_steps(num_atoms, max_elements=2**20):
+    return max(1, max_elements//(3*num_atoms))
+
+
+
+  # compute F.dr (summed over atoms) for a block of MD steps
+  @staticmethod
+  def _get_fdr(position, force, basis_cart, box_row_vecs, nearest_image):
+    """
+    Compute the HMA sum F.dr over all atoms for a block of MD steps.
+
+    Parameters
+    ----------
+    position : numpy.ndarray
+      Atomic fractional positions with shape (steps, atoms, 3).
+    force : numpy.ndarray
+      Atomic forces (eV/Å) with shape (steps, atoms, 3).
+    basis_cart : numpy.ndarray
+      Lattice positions (Å) with shape (atoms, 3).
+    box_row_vecs : numpy.ndarray
+      Box edge (row) vectors in Å.
+    nearest_image : NearestImage
+      Nearest image object of the box.
+
+    Returns
+    -------
+    fdr : numpy.ndarray
+      F.dr (eV) at each MD step.
+
+    """
+    # compact (e.g., float32) positions and forces are converted to float64 for this block only
+    dr = np.matmul(np.asarray(position, dtype=float), box_row_vecs) - basis_cart
+    dr = dr - dr[:,0:1,:] # reference assigment (displacements relative to the first atom)
+    nearest_image.get_nearest_images(dr)
+    return np.einsum('ijk,ijk->i', np.asarray(force, dtype=float), dr)
+
+
+
   # convert direct (fractional) to Cartesian coordinates, for a given box vectors a.
   @staticmethod
   def _direct_to_cart(x, a):
-    r = np.empty((0,3))
-    for i in range(len(x)): # loop over atoms
-      r_i = np.transpose(a).dot(x[i])
-      r = np.append(r, [r_i], axis=0)
-    return r  
- 
+    return np.dot(x, a) # r_i = a^T x_i for all atoms
+
+
+
+# process pool task: F.dr of MD steps [start, stop) from positions and forces in shared memory or memory-mapped files
+def _fdr_worker(task):
+  shared_pos, shared_for, start, stop, basis_cart, box_row_vecs = task
+  shms = []
+  try:
+    position, force = [_attach(shared, shms) for shared in (shared_pos, shared_for)]
+    fdr = Processor._get_fdr(position[start:stop], force[start:stop], basis_cart, box_row_vecs, NearestImage(box_row_vecs))
+    Processor._release_pages(position, start, stop)
+    Processor._release_pages(force, start, stop)
+    del position, force # release the shared buffers before closing
+  finally:
+    for shm in shms:
+      shm.close()
+  return fdr
+
+
+
+# array of a shared memory block or of a memory-mapped file (kind, name, offset, shape, dtype)
+def _attach(shared, shms):
+  kind, name, offset, shape, dtype = shared
+  if kind == 'file':
+    return np.memmap(name, dtype=dtype, mode='r', offset=offset, shape=shape)
+  shm = shared_memory.SharedMemory(name=name)
+  shms.append(shm)
+  return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
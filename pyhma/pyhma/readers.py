@@ -0,0 +1,461 @@
+########################################################################
+# pyHMA: A Python Library for HMA
+#
+# Copyright (c) 2020 University at Buffalo
+#
+# Authors: Sabry Moustafa, Andrew Schultz, and David Kofke
+#
+# pyHMA is free software: you can modify and/or redistribute it under
+# the terms of the Mozilla Public License.
+#
+# pyHMA is distributed in the hope that it will be useful, but without
+# any warranty. See the Mozilla Public License for more details.
+#
+########################################################################
+
+"""
+**Overview**
+
+A module with a pluggable interface of trajectory readers. Each reader takes a list of files (consecutive parts of the same
+MD simulation) and returns the ``data`` dictionary of :py:func:`pyhma.vasp_reader.read`, which is used by
+:py:class:`pyhma.processor.Processor`.
+
+Readers are registered (:py:func:`register`) with file name patterns, so that the format of a file is selected by its name
+(:py:func:`get_format`); a file whose name matches no pattern (e.g., ``vasprun.xml.1``) is read as vasprun. The following
+formats are available:
+
+========== ========================================= ==============================================
+Format     File names                                Reader
+========== ========================================= ==============================================
+vasprun    ``vasprun*.xml``, ``*.xml``               :py:func:`pyhma.vasp_reader.read`
+outcar     ``OUTCAR*``, ``*.outcar``                 :py:func:`read_outcar`
+extxyz     ``*.xyz``, ``*.extxyz``                   :py:func:`read_extxyz`
+lammps     ``dump*``, ``*.dump``, ``*.lammpstrj``    :py:func:`read_lammps_dump`
+========== ========================================= ==============================================
+
+Compressed files (``.bz2``, ``.gz``, or ``.xz``) are matched by the name without the extension, and decompressed while being read.
+The files are read one MD step (frame) at a time, and the positions and forces of each frame are parsed at once into
+NumPy arrays. The first frame of the first file must be the lattice configuration (i.e., forces < force_tol).
+
+Example
+--------
+
+.. code-block:: python
+
+  >>> data = pyhma.readers.read(['OUTCAR-1', 'OUTCAR-2'])
+  >>> data = pyhma.readers.read(['md.xyz'], temperature=1000, timestep=2, ismear=1)
+
+"""
+
+import os
+import re
+import bz2
+import gzip
+import lzma
+import fnmatch
+import itertools
+import numpy as np
+from pyhma import vasp_reader
+from pyhma.array_buffer import ArrayBuffer
+
+_READERS  = {} # format -> reader function
+_PATTERNS = [] # (file name pattern, format), in the order of registration
+
+_NUMBER   = re.compile(r'[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?')
+_INFO     = re.compile(r'(\w+)\s*=\s*(?:"([^"]*)"|(\S+))')
+eV_A3_GPa = 160.21766208 # eV/Å^3 to GPa conversion factor
+
+
+def register(file_format, reader, patterns=()):
+  """
+  Register a trajectory reader.
+
+  Parameters
+  -----------
+  file_format : str
+    Name of the format (e.g., 'outcar').
+  reader : function
+    Reader function ``reader(files, **kwargs)``, returning the ``data`` dictionary of :py:func:`pyhma.vasp_reader.read`.
+  patterns : list
+    File name patterns (case-insensitive, shell-style) of the format, used by :py:func:`get_format`. *Default: ()*
+
+  """
+  _READERS[file_format] = reader
+  _PATTERNS.extend((pattern.lower(), file_format) for pattern in patterns)
+
+
+def get_format(filename):
+  """
+  Return the format of a file from its name, or None if it does not match any registered pattern.
+
+  Parameters
+  -----------
+  filename : str
+    Path of the file.
+
+  """
+  name = os.path.basename(filename).lower()
+  for ext in ('.bz2', '.gz', '.xz'):
+    if name.endswith(ext):
+      name = name[0:-len(ext)]
+  for pattern, file_format in _PATTERNS:
+    if fnmatch.fnmatchcase(name, pattern):
+      return file_format
+  return None
+
+
+def read(files, file_format=None, **kwargs):
+  """
+  Read a trajectory with the reader of its format.
+
+  Parameters
+  -----------
+  files : list
+    List of files of the same MD simulation.
+  file_format : str
+    Name of the format. *Default: None (selected from the name of the first file; vasprun if it matches no pattern)*
+  kwargs : dict
+    Keyword arguments of the reader (e.g., ``force_tol``, ``verbose``, ``temperature``, ``timestep``, and ``ismear``).
+
+  Returns
+  -------
+  data : dict
+    A dictionary of simulation data (see :py:func:`pyhma.vasp_reader.read`).
+
+  """
+  if file_format is None:
+    file_format = get_format(files[0]) or 'vasprun'
+  if file_format not in _READERS:
+    print(' WARNING! Unknown format of', files[0], '(formats: %s).' % ', '.join(_READERS))
+    raise RuntimeError('Illegal trajectory file format.')
+  return _READERS[file_format](files, **kwargs)
+
+
+def read_outcar(outcar_files, force_tol=0.001, raw_files=False, fermi_dirac=False, verbose=False, dtype=float):
+  """
+  Read ``OUTCAR`` file(s) of VASP AIMD simulation.
+
+  The box, the number of atoms, and the INCAR parameters (POTIM, TEBEG, and ISMEAR) are taken from the header. Each MD step
+  has the Cartesian positions and forces (``POSITION ... TOTAL-FORCE`` block), the stress (``in kB`` line), and the energy
+  (``energy(sigma->0)``, or ``free  energy   TOTEN`` for ``fermi_dirac=True``); i.e., the same quantities of ``vasprun.xml``.
+  ``XDATCAR`` files are not supported, since they do not have the forces and energies.
+
+  Parameters
+  -----------
+  outcar_files : list
+    List of OUTCAR files of the same AIMD simulation.
+  force_tol : float
+    Force tolerance (in eV/Å) on initial configuration. *Default: 0.001*.
+  raw_files : bool
+    If True, the raw data files are generated (see :py:func:`pyhma.vasp_reader.read`). *Default: False*.
+  fermi_dirac : bool
+    If true, pyHMA uses the electronic free-energy surface F (not the ground-state E0 energy).
+  verbose : bool
+    If True, pyHMA will print simulation details while reading data. *Default: False*
+  dtype : numpy.dtype
+    Data type of the returned position and force arrays. *Default: float (float64)*
+
+  Returns
+  -------
+  data : dict
+    A dictionary of simulation data (see :py:func:`pyhma.vasp_reader.read`).
+
+  """
+  files_data = (_read_outcar_file(f, i == 0, fermi_dirac) for i, f in enumerate(outcar_files))
+  return vasp_reader._merge(outcar_files, files_data, force_tol, raw_files, fermi_dirac, verbose, dtype)
+
+
+def read_extxyz(xyz_files, temperature, timestep, ismear, force_tol=0.001, raw_files=False, fermi_dirac=False, verbose=False, dtype=float):
+  """
+  Read extended XYZ file(s) (e.g., written by ASE).
+
+  The comment line of each frame must have the box (``Lattice``), the columns of the atom lines (``Properties``, with ``pos``
+  and ``forces``), the energy (``energy``, or ``free_energy`` for ``fermi_dirac=True``) in eV, and the ``virial`` (eV) or
+  ``stress`` (eV/Å^3, ASE sign convention) tensor.
+
+  Parameters
+  -----------
+  xyz_files : list
+    List of extended XYZ files of the same MD simulation.
+  temperature : float
+    NVT set temperature in K (not included in the files).
+  timestep : float
+    MD timestep in fs (not included in the files).
+  ismear : int
+    Smearing method (ISMEAR) of the DFT energies (not included in the files); -1 (Fermi-Dirac) requires ``fermi_dirac=True``.
+  force_tol : float
+    Force tolerance (in eV/Å) on initial configuration. *Default: 0.001*.
+  raw_files : bool
+    If True, the raw data files are generated (see :py:func:`pyhma.vasp_reader.read`). *Default: False*.
+  fermi_dirac : bool
+    If true, the ``free_energy`` of each frame is used. *Default: False*
+  verbose : bool
+    If True, pyHMA will print simulation details while reading data. *Default: False*
+  dtype : numpy.dtype
+    Data type of the returned position and force arrays. *Default: float (float64)*
+
+  Returns
+  -------
+  data : dict
+    A dictionary of simulation data (see :py:func:`pyhma.vasp_reader.read`).
+
+  """
+  header = {'temperature': temperature, 'timestep': timestep, 'ismear': ismear}
+  files_data = (_read_extxyz_file(f, i == 0, header, fermi_dirac) for i, f in enumerate(xyz_files))
+  return vasp_reader._merge(xyz_files, files_data, force_tol, raw_files, fermi_dirac, verbose, dtype)
+
+
+def read_lammps_dump(dump_files, temperature, timestep, ismear, energy_column='c_pe', stress_columns=('c_stress[1]', 'c_stress[2]', 'c_stress[3]'),\
+                     force_tol=0.001, raw_files=False, verbose=False, dtype=float):
+  """
+  Read LAMMPS text dump file(s), in ``metal`` units.
+
+  Each frame must have the positions (``x y z``, ``xu yu zu``, ``xs ys zs``, or ``xsu ysu zsu``), the forces (``fx fy fz``), and
+  the per-atom potential energy and diagonal of the per-atom virial stress (e.g., ``compute pe/atom`` and
+  ``compute stress/atom NULL virial``), whose sums give the energy and the virial pressure of the frame. The atoms are
+  sorted by ``id`` (if dumped).
+
+  Parameters
+  -----------
+  dump_files : list
+    List of dump files of the same MD simulation.
+  temperature : float
+    NVT set temperature in K (not included in the files).
+  timestep : float
+    MD timestep in fs (not included in the files).
+  ismear : int
+    Smearing method (ISMEAR) of the DFT energies that the potential was fitted to (not included in the files), for
+    information only; -1 (Fermi-Dirac) is not allowed, since the energies are not electronic free energies.
+  energy_column : str
+    Column of the per-atom potential energy (eV). *Default: 'c_pe'*
+  stress_columns : tuple
+    Columns of the diagonal of the per-atom stress (bar·Å^3). *Default: ('c_stress[1]', 'c_stress[2]', 'c_stress[3]')*
+  force_tol : float
+    Force tolerance (in eV/Å) on initial configuration. *Default: 0.001*.
+  raw_files : bool
+    If True, the raw data files are generated (see :py:func:`pyhma.vasp_reader.read`). *Default: False*.
+  verbose : bool
+    If True, pyHMA will print simulation details while reading data. *Default: False*
+  dtype : numpy.dtype
+    Data type of the returned position and force arrays. *Default: float (float64)*
+
+  Returns
+  -------
+  data : dict
+    A dictionary of simulation data (see :py:func:`pyhma.vasp_reader.read`).
+
+  """
+  header = {'temperature': temperature, 'timestep': timestep, 'ismear': ismear}
+  files_data = (_read_lammps_file(f, i == 0, header, energy_column, stress_columns) for i, f in enumerate(dump_files))
+  return vasp_reader._merge(dump_files, files_data, force_tol, raw_files, False, verbose, dtype)
+
+
+# open a (compressed) text file for reading
+def _open_text(filename):
+  if filename.endswith('.bz2'):
+    return bz2.open(filename, 'rt')
+  elif filename.endswith('.gz'):
+    return gzip.open(filename, 'rt')
+  elif filename.endswith('.xz'):
+    return lzma.open(filename, 'rt')
+  return open(filename)
+
+
+# header (box, volume, and basis/forces of the first frame) and per-step data of a file, as used by vasp_reader._merge;
+# a file without complete frames is allowed only as a continuation file (not first), which gives zero steps
+def _file_data(filename, first, header, position, force, energy, pressure):
+  if len(energy) == 0:
+    if first:
+      print(' WARNING! No complete frames (positions, forces, energy, and stress) in', filename)
+      raise RuntimeError('Illegal first trajectory file.')
+    return dict(header, num_atoms=0), vasp_reader._empty_steps(0)
+  header = dict(header, num_atoms=position.row_shape[0])
+  header['basis'], header['force_0'] = position.data[0].copy(), force.data[0].copy()
+  header['volume'] = abs(np.linalg.det(header['box_row_vecs']))
+  steps = {'n_complete': len(energy), 'position': position.data, 'force': force.data, 'energy': energy.data, 'pressure': pressure.data}
+  return header, steps
+
+
+# header and per-step data of an OUTCAR file
+def _read_outcar_file(outcar_file, first, fermi_dirac):
+  header  = {}
+  position = force = None
+  incar   = {'POTIM': None, 'TEBEG': None, 'ISMEAR': None}
+  energy  = ArrayBuffer() # total energy (eV)
+  pressure = ArrayBuffer() # virial pressure (GPa)
+  pvir = posfor = None
+  with _open_text(outcar_file) as f:
+    for line in f:
+      if 'in kB' in line:
+        pvir = sum(float(v) for v in _NUMBER.findall(line)[0:3])/3.0/10.0 # kbar to GPa
+      elif 'TOTAL-FORCE' in line:
+        next(f, None) # ---
+        posfor = np.fromstring(''.join(itertools.islice(f, num_atoms)), sep=' ')
+        if posfor.size != 6*num_atoms:
+          break # truncated file
+        posfor = posfor.reshape(num_atoms, 6)
+      elif posfor is not None and ('free  energy   TOTEN' in line if fermi_dirac else 'energy(sigma->0)' in line):
+        if pvir is None:
+          print(' WARNING! No stress (in kB lines) of the MD steps in', outcar_file, '(e.g., ISIF=0).')
+          raise RuntimeError('Illegal OUTCAR file.')
+        values = _NUMBER.findall(line.split('=')[-1])
+        position.append((posfor[:,0:3] @ inv_box)[None,:])
+        force.append(posfor[None,:,3:6])
+        energy.append([float(values[0])])
+        pressure.append([pvir])
+        pvir = posfor = None
+      elif len(energy) == 0: # header
+        if 'direct lattice vectors' in line and 'box_row_vecs' not in header:
+          box = [_NUMBER.findall(next(f))[0:3] for i in range(3)]
+          header['box_row_vecs'] = np.array(box, dtype=float)
+          inv_box = np.linalg.inv(header['box_row_vecs'])
+        elif 'NIONS' in line:
+          num_atoms = int(line.split('NIONS')[1].split('=')[1].split()[0])
+          position = ArrayBuffer((num_atoms,3)) # fractional positions
+          force    = ArrayBuffer((num_atoms,3)) # forces (eV/Å)
+        else:
+          for name in incar:
+            if incar[name] is None and name in line:
+              match = re.search(name + r'\s*=\s*(' + _NUMBER.pattern + ')', line)
+              if match:
+                incar[name] = float(match.group(1))
+
+  header.update(timestep=incar['POTIM'], temperature=incar['TEBEG'], ismear=None if incar['ISMEAR'] is None else int(incar['ISMEAR']))
+  return _file_data(outcar_file, first, header, position, force, energy, pressure)
+
+
+# header and per-step data of an extended XYZ file
+def _read_extxyz_file(xyz_file, first, header, fermi_dirac):
+  position = force = None
+  energy   = ArrayBuffer() # total energy (eV)
+  pressure = ArrayBuffer() # virial pressure (GPa)
+  with _open_text(xyz_file) as f:
+    for line in f:
+      if not line.strip():
+        break
+      num_atoms = int(line)
+      info  = {m.group(1).lower(): m.group(2) if m.group(2) is not None else m.group(3) for m in _INFO.finditer(next(f, ''))}
+      lines = list(itertools.islice(f, num_atoms))
+      if len(lines) < num_atoms:
+        break # truncated file
+
+      if position is None:
+        header = dict(header, box_row_vecs=np.fromstring(info['lattice'], sep=' ').reshape(3,3))
+        inv_box  = np.linalg.inv(header['box_row_vecs'])
+        volume   = abs(np.linalg.det(header['box_row_vecs']))
+        columns  = _extxyz_columns(info.get('properties', 'species:S:1:pos:R:3'))
+        position = ArrayBuffer((num_atoms,3)) # fractional positions
+        force    = ArrayBuffer((num_atoms,3)) # forces (eV/Å)
+      if columns['numeric']:
+        values = np.fromstring(''.join(lines), sep=' ').reshape(num_atoms, -1)
+      else:
+        values = np.array(''.join(lines).split()).reshape(num_atoms, -1)
+      position.append((values[:,columns['pos']].astype(float) @ inv_box)[None,:])
+      force.append(values[None,:,columns['forces']].astype(float))
+      energy.append([float(info['free_energy' if fermi_dirac else 'energy'])])
+      if 'virial' in info:
+        pressure.append([_trace(info['virial'])/3.0/volume*eV_A3_GPa])
+      else:
+        pressure.append([-_trace(info['stress'])/3.0*eV_A3_GPa])
+
+  return _file_data(xyz_file, first, header, position, force, energy, pressure)
+
+
+# columns of the positions and forces in the atom lines of an extended XYZ file, from its Properties
+def _extxyz_columns(properties):
+  fields  = properties.split(':')
+  columns = {'numeric': True}
+  start   = 0
+  for name, kind, count in zip(fields[0::3], fields[1::3], fields[2::3]):
+    columns[name.lower()] = slice(start, start + int(count))
+    columns['numeric'] = columns['numeric'] and kind.upper() in ('R', 'I')
+    start += int(count)
+  if 'force' in columns:
+    columns.setdefault('forces', columns['force'])
+  if 'pos' not in columns or 'forces' not in columns:
+    print(' WARNING! No positions and forces in Properties=' + properties)
+    raise RuntimeError('Illegal extended XYZ file.')
+  return columns
+
+
+# trace of a 3x3 tensor, given as 9 (or 6 Voigt) values in a string
+def _trace(tensor):
+  values = np.fromstring(tensor, sep=' ')
+  return values[0] + values[4] + values[8] if len(values) == 9 else np.sum(values[0:3])
+
+
+# header and per-step data of a LAMMPS text dump file
+def _read_lammps_file(dump_file, first, header, energy_column, stress_columns):
+  position = force = None
+  energy   = ArrayBuffer() # total energy (eV)
+  pressure = ArrayBuffer() # virial pressure (GPa)
+  with _open_text(dump_file) as f:
+    for line in f:
+      if line.startswith('ITEM: NUMBER OF ATOMS'):
+        num_atoms = int(next(f))
+      elif line.startswith('ITEM: BOX BOUNDS'):
+        bounds = np.zeros((3,3))
+        for i in range(3):
+          values = np.fromstring(next(f), sep=' ')
+          bounds[i,0:len(values)] = values
+        box_row_vecs, origin = _lammps_box(bounds)
+        inv_box = np.linalg.inv(box_row_vecs)
+      elif line.startswith('ITEM: ATOMS'):
+        lines = list(itertools.islice(f, num_atoms))
+        if len(lines) < num_atoms:
+          break # truncated file
+        if position is None:
+          header   = dict(header, box_row_vecs=box_row_vecs)
+          columns  = _lammps_columns(line.split()[2:], energy_column, stress_columns)
+          position = ArrayBuffer((num_atoms,3)) # fractional positions
+          force    = ArrayBuffer((num_atoms,3)) # forces (eV/Å)
+        values = np.fromstring(''.join(lines), sep=' ').reshape(num_atoms, -1)
+        if 'id' in columns:
+          values = values[np.argsort(values[:,columns['id']], kind='stable')]
+        if columns['scaled']:
+          position.append(values[None,:,columns['pos']])
+        else:
+          position.append(((values[:,columns['pos']] - origin) @ inv_box)[None,:])
+        force.append(values[None,:,columns['force']])
+        energy.append([np.sum(values[:,columns['energy']])])
+        volume = abs(np.linalg.det(box_row_vecs))
+        pressure.append([-np.sum(values[:,columns['stress']])/3.0/volume*1e-4]) # bar to GPa
+
+  return _file_data(dump_file, first, header, position, force, energy, pressure)
+
+
+# box (row) vectors and origin from the BOX BOUNDS of a LAMMPS dump (lo, hi, and tilt factor of each row)
+def _lammps_box(bounds):
+  (xlo, xhi, xy), (ylo, yhi, xz), (zlo, zhi, yz) = bounds
+  xlo -= min(0.0, xy, xz, xy + xz)
+  xhi -= max(0.0, xy, xz, xy + xz)
+  ylo -= min(0.0, yz)
+  yhi -= max(0.0, yz)
+  box_row_vecs = np.array([[xhi - xlo, 0, 0], [xy, yhi - ylo, 0], [xz, yz, zhi - zlo]])
+  return box_row_vecs, np.array([xlo, ylo, zlo])
+
+
+# column indices of the atom lines of a LAMMPS dump
+def _lammps_columns(names, energy_column, stress_columns):
+  columns = {'scaled': False}
+  for pos_names in (('x', 'y', 'z'), ('xu', 'yu', 'zu'), ('xs', 'ys', 'zs'), ('xsu', 'ysu', 'zsu')):
+    if all(n in names for n in pos_names):
+      columns['pos'] = [names.index(n) for n in pos_names]
+      columns['scaled'] = pos_names[0].startswith('xs')
+      break
+  required = {'force': ('fx', 'fy', 'fz'), 'energy': (energy_column,), 'stress': tuple(stress_columns)}
+  for key, key_names in required.items():
+    if 'pos' not in columns or not all(n in names for n in key_names):
+      print(' WARNING! Missing columns of positions, forces (fx fy fz), energy (%s), or stress (%s) in ITEM: ATOMS %s'\
+            % (energy_column, ' '.join(stress_columns), ' '.join(names)))
+      raise RuntimeError('Illegal LAMMPS dump file.')
+    columns[key] = [names.index(n) for n in key_names]
+  if 'id' in names:
+    columns['id'] = names.index('id')
+  return columns
+
+
+register('vasprun', vasp_reader.read, ('vasprun*.xml', '*.xml'))
+register('outcar', read_outcar, ('outcar*', '*.outcar'))
+register('extxyz', read_extxyz, ('*.xyz', '*.extxyz'))
+register('lammps', read_lammps_dump, ('dump*', '*.dump', '*.lammpstrj'))
@@ -0,0 +1,127 @@
+########################################################################
+# pyHMA: A Python Library for HMA
+#
+# Copyright (c) 2020 University at Buffalo
+#
+# Authors: Sabry Moustafa, Andrew Schultz, and David Kofke
+#
+# pyHMA is free software: you can modify and/or redistribute it under
+# the terms of the Mozilla Public License.
+#
+# pyHMA is distributed in the hope that it will be useful, but without
+# any warranty. See the Mozilla Public License for more details.
+#
+########################################################################
+
+"""
+**Overview**
+
+A module for resampling (bootstrap and jackknife) uncertainties and confidence intervals of averages, and of quantities derived
+from them, using the block averages of the anharmonic properties (see :py:meth:`pyhma.processor.Processor.get_resampled_stats`).
+
+A derived quantity is given as a function ``func(avgs)`` of the averages of all columns, where ``avgs`` has the shape
+(replicates, columns); i.e., the function is applied to all replicates at once (e.g., ``lambda a: a[:,1]/a[:,3]``).
+It must be a module-level function if ``workers`` > 1.
+
+"""
+
+import multiprocessing
+from statistics import NormalDist
+import numpy as np
+
+_MAX_ELEMENTS = 2**20 # maximum number of resampled block averages held in memory by one batch
+
+
+def bootstrap(block_data, func=None, n_samples=1000, seed=0, confidence=0.95, workers=1):
+  """
+  Bootstrap uncertainty and percentile confidence interval.
+
+  Each replicate draws len(block_data) block averages with replacement. The replicates are generated in batches of
+  resampled index arrays, each from its own random stream derived from ``seed``, so the results are reproducible and
+  do not depend on ``workers``.
+
+  Parameters
+  -----------
+  block_data : numpy.ndarray
+    Block averages with shape (blocks, columns).
+  func : function
+    Derived quantity of the averages (see above). *Default: None (averages of all columns)*
+  n_samples : int
+    Number of bootstrap replicates. *Default: 1000*
+  seed : int
+    Random seed. *Default: 0*
+  confidence : float
+    Confidence level of the interval. *Default: 0.95*
+  workers : int
+    Number of processes used to generate the replicates. *Default: 1 (serial)*
+
+  Returns
+  -------
+  stats : dict
+    Estimate (``avg``), uncertainty (``err``), and confidence interval (``ci_low`` and ``ci_high``) arrays.
+
+  """
+  block_data = np.asarray(block_data, dtype=float)
+  n_blocks = len(block_data)
+  batch = max(1, _MAX_ELEMENTS//(n_blocks*block_data.shape[1]))
+  seeds = np.random.SeedSequence(seed).spawn(-(-n_samples//batch))
+  tasks = [(block_data, func, min(batch, n_samples - i*batch), seed_i) for i, seed_i in enumerate(seeds)]
+  if workers > 1 and len(tasks) > 1:
+    with multiprocessing.Pool(workers) as pool:
+      replicates = pool.map(_bootstrap_batch, tasks)
+  else:
+    replicates = [_bootstrap_batch(task) for task in tasks]
+  replicates = np.concatenate(replicates)
+
+  alpha = 0.5*(1 - confidence)
+  return {'avg': _apply(func, np.average(block_data, axis=0)[None,:])[0],
+          'err': np.std(replicates, ddof=1, axis=0),
+          'ci_low': np.percentile(replicates, 100*alpha, axis=0),
+          'ci_high': np.percentile(replicates, 100*(1 - alpha), axis=0)}
+
+
+def jackknife(block_data, func=None, confidence=0.95):
+  """
+  Jackknife uncertainty and (normal) confidence interval.
+
+  The leave-one-block-out averages are obtained together from the total sum, and the bias-corrected estimate
+  is reported.
+
+  Parameters
+  -----------
+  block_data : numpy.ndarray
+    Block averages with shape (blocks, columns).
+  func : function
+    Derived quantity of the averages (see above). *Default: None (averages of all columns)*
+  confidence : float
+    Confidence level of the interval. *Default: 0.95*
+
+  Returns
+  -------
+  stats : dict
+    Estimate (``avg``), uncertainty (``err``), and confidence interval (``ci_low`` and ``ci_high``) arrays.
+
+  """
+  block_data = np.asarray(block_data, dtype=float)
+  n_blocks = len(block_data)
+  theta = _apply(func, np.average(block_data, axis=0)[None,:])[0]
+  replicates = _apply(func, (np.sum(block_data, axis=0) - block_data)/(n_blocks-1)) # leave-one-out
+  avg = n_blocks*theta - (n_blocks-1)*np.average(replicates, axis=0)
+  err = np.sqrt((n_blocks-1)*np.average((replicates - np.average(replicates, axis=0))**2, axis=0))
+  z = NormalDist().inv_cdf(0.5*(1 + confidence))
+  return {'avg': avg, 'err': err, 'ci_low': avg - z*err, 'ci_high': avg + z*err}
+
+
+# derived quantity of the averages (replicates, columns); the averages themselves if func is None
+def _apply(func, avgs):
+  if func is None:
+    return avgs
+  return np.asarray(func(avgs))
+
+
+# bootstrap replicates of one batch (block_data, func, n_samples, seed_sequence)
+def _bootstrap_batch(task):
+  block_data, func, n_samples, seed = task
+  rng = np.random.default_rng(seed)
+  indices = rng.integers(0, len(block_data), size=(n_samples, len(block_data)))
+  return _apply(func, np.average(block_data[indices], axis=1))
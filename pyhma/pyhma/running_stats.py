@@ -0,0 +1,140 @@
+########################################################################
+# pyHMA: A Python Library for HMA
+#
+# Copyright (c) 2020 University at Buffalo
+#
+# Authors: Sabry Moustafa, Andrew Schultz, and David Kofke
+#
+# pyHMA is free software: you can modify and/or redistribute it under
+# the terms of the Mozilla Public License.
+#
+# pyHMA is distributed in the hope that it will be useful, but without
+# any warranty. See the Mozilla Public License for more details.
+#
+########################################################################
+
+
+"""
+This module keeps running block-averaging statistics (average, uncertainty, and adjacent blocks correlation) of a data series
+that grows in batches, without storing the series itself.
+
+"""
+
+
+import numpy as np
+
+class RunningStats:
+  """
+  Running block-averaging statistics of a multi-column data series.
+
+  Only running sums are kept: the sum of the production steps, the sum of the current (incomplete) block, and the sums of
+  the block averages, of their squares, and of the products of adjacent block averages. Adding a batch of steps
+  costs O(batch size), and the statistics are available in O(1) at any time. The definitions are the same as those of
+  :py:meth:`pyhma.processor.Processor.get_stats`.
+
+  Parameters
+  -----------
+  steps_eq : int
+    Number of MD steps used for equilibaration (not included in the statistics).
+  blocksize : int
+    Number of MD steps in each block used for block averaging.
+  num_columns : int
+    Number of data columns. *Default: 4*
+
+  """
+
+  def __init__(self, steps_eq, blocksize, num_columns=4):
+    self.steps_eq   = steps_eq
+    self.blocksize  = blocksize
+    self.steps      = 0                       # number of steps added (including equilibration steps)
+    self.n_blocks   = 0                       # number of complete blocks
+    self._shift     = None                    # first production step, subtracted from all data for numerical stability
+    self._sum       = np.zeros(num_columns)   # sum of production steps
+    self._block_sum = np.zeros(num_columns)   # sum of the steps of the current block
+    self._block_n   = 0                       # number of steps in the current block
+    self._s1        = np.zeros(num_columns)   # sum of block averages
+    self._s2        = np.zeros(num_columns)   # sum of squared block averages
+    self._lag       = np.zeros(num_columns)   # sum of products of adjacent block averages
+    self._first     = None                    # first block average
+    self._last      = None                    # last block average
+
+  @property
+  def n_prod(self):
+    """ Number of production steps. """
+    return max(0, self.steps - self.steps_eq)
+
+  def add(self, data):
+    """
+    Add a batch of steps to the statistics.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+      Data of the new steps, with shape (steps, num_columns).
+
+    """
+    data = np.asarray(data, dtype=float)
+    n_eq = min(len(data), max(0, self.steps_eq - self.steps)) # equilibration steps in this batch
+    self.steps += len(data)
+    data = data[n_eq:]
+    if len(data) == 0:
+      return
+    if self._shift is None:
+      self._shift = data[0].copy()
+    data = data - self._shift
+    self._sum += data.sum(axis=0)
+
+    # complete the current block
+    n_fill = min(len(data), self.blocksize - self._block_n)
+    self._block_sum += data[0:n_fill].sum(axis=0)
+    self._block_n += n_fill
+    data = data[n_fill:]
+    if self._block_n < self.blocksize:
+      return
+    block_avgs = [self._block_sum[None,:]/self.blocksize]
+    # whole blocks in this batch
+    n_blocks = len(data)//self.blocksize
+    block_avgs.append(data[0:n_blocks*self.blocksize].reshape(n_blocks, self.blocksize, len(self._sum)).mean(axis=1))
+    block_avgs = np.concatenate(block_avgs)
+    # start the next block
+    self._block_sum = data[n_blocks*self.blocksize:].sum(axis=0)
+    self._block_n = len(data) - n_blocks*self.blocksize
+
+    if self._first is None:
+      self._first = block_avgs[0]
+    else:
+      self._lag += self._last*block_avgs[0]
+    self._lag += np.sum(block_avgs[0:-1]*block_avgs[1:], axis=0)
+    self._s1 += block_avgs.sum(axis=0)
+    self._s2 += np.sum(block_avgs**2, axis=0)
+    self._last = block_avgs[-1]
+    self.n_blocks += len(block_avgs)
+
+  def get_stats(self):
+    """
+    Return the current statistics.
+
+    Returns
+    -------
+    avg : numpy.ndarray
+      Average of each column over the production steps.
+    err : numpy.ndarray
+      Uncertainty (standard error of block averages) of each column (NaN for less than two blocks).
+    cor : numpy.ndarray
+      Correlation between adjacent block averages of each column (NaN for less than two blocks).
+
+    """
+    num_columns = len(self._sum)
+    if self.n_prod == 0:
+      return np.full(num_columns, np.nan), np.full(num_columns, np.nan), np.full(num_columns, np.nan)
+    avg = self._sum/self.n_prod + self._shift
+    if self.n_blocks < 2:
+      return avg, np.full(num_columns, np.nan), np.full(num_columns, np.nan)
+    nb = self.n_blocks
+    m = self._s1/nb
+    var = self._s2/nb - m**2 # using N, not N-1
+    err = np.sqrt(np.maximum(var, 0)*nb/(nb-1)/nb)
+    lag = self._lag - m*(2*self._s1 - self._first - self._last) + (nb-1)*m**2
+    with np.errstate(divide='ignore', invalid='ignore'):
+      cor = lag/(nb-1)/var
+    return avg, err, cor
@@ -0,0 +1,89 @@
+########################################################################
+# pyHMA: A Python Library for HMA
+#
+# Copyright (c) 2020 University at Buffalo
+#
+# Authors: Sabry Moustafa, Andrew Schultz, and David Kofke
+#
+# pyHMA is free software: you can modify and/or redistribute it under
+# the terms of the Mozilla Public License.
+#
+# pyHMA is distributed in the hope that it will be useful, but without
+# any warranty. See the Mozilla Public License for more details.
+#
+########################################################################
+
+"""
+**Overview**
+
+A module for storing the ``data`` dictionary (see :py:func:`pyhma.vasp_reader.read`) on disk as a trajectory store, and for loading
+it back with memory-mapped arrays.
+
+A trajectory store is a directory with one ``.npy`` file per per-step array (``position``, ``force``, ``energy``, and ``pressure``)
+and a ``header.json`` file for the remaining entries. Loaded with ``mmap=True``, the arrays are not read into memory;
+:py:class:`pyhma.processor.Processor` uses them as they are and reads them in chunks of MD steps, so memory stays close to
+one chunk rather than the whole trajectory.
+
+Example
+--------
+
+.. code-block:: python
+
+  >>> pyhma.trajectory.save('trajectory', pyhma.read(['vasprun-1.xml', 'vasprun-2.xml']))
+  >>> data = pyhma.trajectory.load('trajectory')
+  >>> proc = pyhma.Processor(data, pressure_qh=4.94154)
+
+"""
+
+import os
+import json
+import numpy as np
+
+_STEPS_KEYS = ('position', 'force', 'energy', 'pressure')
+_HEADER     = 'header.json'
+
+
+def save(path, data):
+  """
+  Save a ``data`` dictionary to a trajectory store.
+
+  Parameters
+  -----------
+  path : str
+    Directory of the trajectory store (created if needed).
+  data : dict
+    A dictionary of simulation data (see :py:func:`pyhma.vasp_reader.read`).
+
+  """
+  os.makedirs(path, exist_ok=True)
+  for k in _STEPS_KEYS:
+    np.save(os.path.join(path, k + '.npy'), np.asarray(data[k])) # the data type (e.g., float32 positions) is kept
+  header = {k: np.asarray(v).tolist() for k, v in data.items() if k not in _STEPS_KEYS}
+  with open(os.path.join(path, _HEADER), 'w') as f:
+    json.dump(header, f)
+
+
+def load(path, mmap=True):
+  """
+  Load a ``data`` dictionary from a trajectory store.
+
+  Parameters
+  -----------
+  path : str
+    Directory of the trajectory store.
+  mmap : bool
+    If True, the per-step arrays are memory-mapped (read-only) rather than read into memory. *Default: True*
+
+  Returns
+  -------
+  data : dict
+    A dictionary of simulation data (see :py:func:`pyhma.vasp_reader.read`).
+
+  """
+  with open(os.path.join(path, _HEADER)) as f:
+    data = json.load(f)
+  for k in ('box_row_vecs', 'basis'):
+    data[k] = np.array(data[k])
+  for k in _STEPS_KEYS:
+    data[k] = np.load(os.path.join(path, k + '.npy'), mmap_mode='r' if mmap else None)
+  return data
@@ -22,17 +22,28 @@ A module for extracting data from ``vasprun.xml`` output file(s) of VASP AIMD si
 """
 
 
+import os
+import bz2
+import gzip
+import lzma
+import contextlib
+import functools
+import multiprocessing
 import numpy as np
 import lxml.etree 
+from pyhma.array_buffer import ArrayBuffer
+from pyhma import output
+from pyhma import cache as _cache
 
-def read(vasprun_files, force_tol=0.001, raw_files=False, fermi_dirac=False, verbose=False):
+def read(vasprun_files, force_tol=0.001, raw_files=False, fermi_dirac=False, verbose=False, stream=False, workers=1,\
+         cache=False, cache_dir=None, cache_size_limit=_cache.CACHE_SIZE_LIMIT, dtype=float):
   """
   A function that uses LXML parser to extract raw data from ``vasprun.xml`` file(s).
 
   Parameters
   -----------
   vasprun_files : list
-    List of vasprun.xml files of the same AIMD simulation.
+    List of vasprun.xml files of the same AIMD simulation. Compressed files (``.bz2``, ``.gz``, or ``.xz``) are decompressed while being parsed.
   force_tol : float
     Force tolerance (in eV/Å) on initial configuration. *Default: 0.001*.
   raw_files : bool
@@ -41,25 +52,43 @@ def read(vasprun_files, force_tol=0.001, raw_files=False, fermi_dirac=False, ver
     If True, pyHMA will print simulation details while reading data. *Default: False*
   fermi_dirac : bool
     If true, pyHMA uses the electronic free-energy surface F (not the ground-state E0 energy).
+  stream : bool
+    If True, each ``vasprun.xml`` file is parsed incrementally: every ``<calculation>`` element is extracted as soon as it
+    is complete and then discarded, so that memory use does not grow with the file size. *Default: False*
+  workers : int
+    Number of processes used to parse (and decompress) the ``vasprun.xml`` files in parallel (one file per process at a time). The data
+    of all files is merged in the given order. *Default: 1 (serial)*
+  cache : bool or str
+    If True, the data parsed from each ``vasprun.xml`` file is saved to a binary cache file, which is used instead of parsing
+    the file again in later calls (see :py:mod:`pyhma.cache`). If 'refresh', existing cache files are ignored and rewritten.
+    If False, cache files are neither read nor written. A cache file that cannot be written (e.g., in an unwritable directory)
+    is skipped with a warning. *Default: False*
+  cache_dir : str
+    Directory of the cache files. *Default: None (a sidecar file vasprun.xml.pyhma.npz next to each vasprun.xml)*
+  cache_size_limit : int
+    Maximum total size (bytes) of the cache files in a cache directory; the least recently used files are removed first. *Default: 10 GiB*
+  dtype : numpy.dtype
+    Data type of the returned position and force arrays; e.g., numpy.float32 halves their memory (the values are parsed,
+    and later processed, in float64). *Default: float (float64)*
  
 
   Returns
   -------
-  box_row_vecs : list
+  box_row_vecs : numpy.ndarray
     Box edge (row) vectors in Å.
   num_atoms : int
     Total number of atoms.
   volume_atom : float
     Volume per atom in Å^3.
-  basis : list
-    List of atomic fractional positions of first configuration.
-  position : list
-    Instantaneous atomic fractional positions.
-  force : list
-    Instantaneous atomic forces in eV/Å.
-  energy : list
+  basis : numpy.ndarray
+    Atomic fractional positions of first configuration (atoms, 3).
+  position : numpy.ndarray
+    Instantaneous atomic fractional positions (steps, atoms, 3).
+  force : numpy.ndarray
+    Instantaneous atomic forces in eV/Å (steps, atoms, 3).
+  energy : numpy.ndarray
     Instantaneous potential energy E0, or electronic free energy F (for ISMEAR=-1), in eV/atom. 
-  pressure : list
+  pressure : numpy.ndarray
     Instantaneous pressure in GPa. 
   pressure_ig : float
     Ideal gas pressure in GPa.
@@ -91,18 +120,104 @@ def read(vasprun_files, force_tol=0.001, raw_files=False, fermi_dirac=False, ver
 
   """
 
-  box_row_vecs = [] # box edge (row) vectors  
-  basis        = [] # List of atomic fractional positions of first configuration 
-  position     = [] # Instantaneous atomic fractional positions 
-  force        = [] # Instantaneous atomic forces in eV/Å
-  energy       = [] # Instantaneous potential energy E0, or electronic free energy F (for ISMEAR=-1), in eV/atom. 
-  pressure     = [] # Instantaneous pressure in GPa
   n_files      = len(vasprun_files) # number of vasprun.xml files
-  parser       = lxml.etree.XMLParser(recover=True) # LXML parser with the capability to handle broken (incomplete) XML files
-  list_len     = 0 # total number of complete scf steps found in vasprun.xml files
+  if cache and cache_dir is not None:
+    try:
+      os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+      print(' WARNING! Could not create the cache directory', cache_dir, '(%s)' % e)
+  read_file    = functools.partial(_read_file, fermi_dirac=fermi_dirac, stream=stream, cache=cache, cache_dir=cache_dir)
+  pool         = None
+  if workers > 1 and n_files > 1:
+    pool       = multiprocessing.Pool(min(workers, n_files))
+    files_data = pool.imap(read_file, vasprun_files) # parsed in parallel, but returned in order
+  else:
+    files_data = map(read_file, vasprun_files)
+
+  try:
+    return _merge(vasprun_files, files_data, force_tol, raw_files, fermi_dirac, verbose, dtype)
+  finally:
+    if pool is not None:
+      pool.terminate()
+    if cache:
+      # keep the cache directories within the size limit
+      cache_dirs = {cache_dir} if cache_dir is not None else {os.path.dirname(f) for f in vasprun_files}
+      for directory in cache_dirs:
+        try:
+          _cache.evict(directory, cache_size_limit)
+        except OSError as e:
+          print(' WARNING! Could not evict the cache files of', directory or '.', '(%s)' % e)
+
+
+def read_raw(temperature, timestep, ismear, directory='.', dtype=float):
+  """
+  A function that reads the raw data files generated by :py:func:`read` (with ``raw_files=True``): poscar_eq.dat, posfor.dat,
+  energy.dat, and pressure.dat. Each file is parsed at once into NumPy arrays, so that the data can be processed again
+  without parsing the ``vasprun.xml`` files.
+
+  Parameters
+  -----------
+  temperature : float
+    NVT set temperature in K (not included in the raw files).
+  timestep : float
+    MD timestep in fs (not included in the raw files).
+  ismear : int
+    Smearing method (ISMEAR) of the MD run (not included in the raw files).
+  directory : str
+    Directory of the raw data files. *Default: '.'*
+  dtype : numpy.dtype
+    Data type of the returned position and force arrays (see :py:func:`read`). *Default: float (float64)*
+
+  Returns
+  -------
+  data : dict
+    A dictionary of the same data returned by :py:func:`read` (with the precision of the raw files, 8 decimal places).
+
+  Example
+  --------
+
+  .. code-block:: python
+
+      >>> data = pyhma.read_raw(temperature=1000, timestep=2, ismear=1)
+
+  """
+
+  with open(os.path.join(directory, 'poscar_eq.dat')) as f:
+    lines = f.readlines()
+  box_row_vecs = np.fromstring(' '.join(lines[2:5]), sep=' ').reshape(3,3)
+  num_atoms    = int(lines[5].split()[0])
+  basis        = np.fromstring(' '.join(lines[7:7+num_atoms]), sep=' ').reshape(num_atoms,3)
+  volume_atom  = abs(np.linalg.det(box_row_vecs))/num_atoms
+
+  # each step of posfor.dat: step index, followed by positions and forces of all atoms
+  posfor   = np.fromfile(os.path.join(directory, 'posfor.dat'), sep=' ')
+  energy   = np.fromfile(os.path.join(directory, 'energy.dat'), sep=' ')
+  pressure = np.fromfile(os.path.join(directory, 'pressure.dat'), sep=' ')
+  n_steps  = min(len(posfor)//(1+6*num_atoms), len(energy), len(pressure)) # complete steps
+  posfor   = posfor[0:n_steps*(1+6*num_atoms)].reshape(n_steps, 1+6*num_atoms)[:,1:].reshape(n_steps, num_atoms, 6)
+
+  kB = 0.0000861733063733830                     # Boltzmann's constant (eV/K)
+  eV2J = 1.602176634e-19                         # eV to Joules conversion factor
+  kBT_J  = kB*temperature*eV2J                   # kT (J)
+  pressure_ig = kBT_J/(volume_atom*1e-30)*1e-9   # ideal gas pressure (GPa)
+
+  return {'box_row_vecs': box_row_vecs, 'num_atoms': num_atoms, 'volume_atom': volume_atom, 'basis': basis,\
+          'position': np.ascontiguousarray(posfor[:,:,0:3], dtype=dtype), 'force': np.ascontiguousarray(posfor[:,:,3:6], dtype=dtype),\
+          'energy': energy[0:n_steps], 'pressure': pressure[0:n_steps], 'pressure_ig': pressure_ig, 'timestep': timestep,\
+          'temperature': temperature, 'ismear': ismear}
+
+
+def _merge(vasprun_files, files_data, force_tol, raw_files, fermi_dirac, verbose, dtype=float):
+  """
+  Merge the header information and per-step data of (consecutive) ``vasprun.xml`` files, in the given order.
+
+  The lattice (box, basis, and initial forces) is taken from the first file, and the INCAR parameters from
+  the second file (or the first one, if only one file is given or the second one has none; e.g., an empty file).
 
-  for i, vasprun_file_i in enumerate(vasprun_files): 
-    tree = lxml.etree.parse(vasprun_file_i, parser) # parsing the whole vasprun.xml file 
+  """
+  n_files = len(vasprun_files) # number of vasprun.xml files
+  for i, (header, steps) in enumerate(files_data): 
+    vasprun_file_i = vasprun_files[i]
     if verbose: 
       if i == 0: 
         print('\nReading' , *vasprun_files) 
@@ -112,19 +227,14 @@ def read(vasprun_files, force_tol=0.001, raw_files=False, fermi_dirac=False, ver
 
     # extract first step information
     if i == 0: 
-      num_atoms   = int(tree.find("./atominfo/atoms").text) # total number of atoms
-      volume_atom = float(tree.find("./structure/crystal/i[@name='volume']").text)/num_atoms # average volume per atom
-      # box edge (row) vectors
-      for v in tree.find("./structure/crystal/varray[@name='basis']"): 
-        box_row_vecs.append([float(x) for x in v.text.split()]) 
-      # initial positions (must be equilibrium configuration that minimizes energy)
-      for v in tree.find("./structure[@name='initialpos']/varray[@name='positions']"): 
-        basis.append([float(x) for x in v.text.split()]) 
-
-      # extract initial forces (must be smaller than the user-defined force tolerance, force_tol)
-      force_0 = [] # forces of atoms in the first configuration 
-      for v in tree.find("./calculation/varray[@name='forces']"): 
-        force_0.append([float(x) for x in v.text.split()])
+      num_atoms    = header['num_atoms']             # total number of atoms
+      volume_atom  = header['volume']/num_atoms      # average volume per atom
+      box_row_vecs = header['box_row_vecs']          # box edge (row) vectors
+      basis        = header['basis']                 # initial positions (must be equilibrium configuration that minimizes energy)
+      force_0      = header['force_0']               # forces of atoms in the first configuration (must be smaller than force_tol)
+      if box_row_vecs is None or basis is None or force_0 is None:
+        print(' WARNING! No box, initial positions, or forces of the first configuration in', vasprun_files[0])
+        raise RuntimeError('Illegal first configuration.')
       # print initial configuration structure and forces 
       if verbose:
         print('',num_atoms, 'atoms (total)')
@@ -143,8 +253,12 @@ def read(vasprun_files, force_tol=0.001, raw_files=False, fermi_dirac=False, ver
         return
 
     # extract smearing method (ISMEAR), timestep (fs), temperature (K), and compute ideal-gas pressure (GPa).
+    if i == 0:
+      header_0 = header
     if i == (0 if n_files == 1 else 1): 
-      ismear = int(tree.find("./incar/i[@name='ISMEAR']").text) # smearing method
+      if header['timestep'] is None and header['temperature'] is None:
+        header = dict(header, ismear=header_0['ismear'], timestep=header_0['timestep'], temperature=header_0['temperature'])
+      ismear = header['ismear'] # smearing method
       if fermi_dirac and ismear == -1:
         print(' NOTE')
         print(' ====')
@@ -165,8 +279,8 @@ def read(vasprun_files, force_tol=0.001, raw_files=False, fermi_dirac=False, ver
         print(' EXITING pyHMA!\n')
         return
       
-      timestep = float(tree.find("./incar/i[@name='POTIM']").text) # timestep (fs)
-      temperature  = float(tree.find("./incar/i[@name='TEBEG']").text) # temperature (K)
+      timestep     = header['timestep']              # timestep (fs)
+      temperature  = header['temperature']           # temperature (K)
       kB = 0.0000861733063733830                     # Boltzmann's constant (eV/K)
       eV2J = 1.602176634e-19                         # eV to Joules conversion factor
       kBT_eV = kB*temperature                        # kT (eV)
@@ -177,53 +291,27 @@ def read(vasprun_files, force_tol=0.001, raw_files=False, fermi_dirac=False, ver
     if verbose:
       print('  Reading' , vasprun_file_i ,' (', i+1,'out of' , n_files, ')')
 
-    # extract positions
-    for pos_elem in tree.findall("./calculation/structure/varray[@name='positions']"): 
-      r = [] 
-      for v in pos_elem: 
-        r.append([float(x) for x in v.text.split()]) 
-      position.append(r) 
-   
-    # extract forces
-    for for_elem in tree.findall("./calculation/varray[@name='forces']"): 
-      f = [] 
-      for v in for_elem: 
-        f.append([float(x) for x in v.text.split()]) 
-      force.append(f) 
-    
-    # extract energies
-    if fermi_dirac:
-      # extract electronic free energy F (using Fermi-Dirac statistics)
-      for e in tree.findall("./calculation"):
-        ee = e.findall("./scstep/energy/i[@name='e_fr_energy']")
-        if len(ee) != 0:
-          energy.append(float(ee[-1].text)/num_atoms)  
-    else:
-      # extract ground state energy E0
-      for e in tree.findall("./calculation"):
-        ee = e.findall("./scstep/energy/i[@name='e_0_energy']")
-        if len(ee) != 0:
-          energy.append(float(ee[-1].text)/num_atoms) 
-     
-    # extract virial pressures (i.e., total - ideal gas)
-    for pvir_elem in tree.findall("./calculation/varray[@name='stress']"): 
-      pvir = 0 
-      for n, v in enumerate(pvir_elem): 
-        pvir += float(v.text.split()[n]) 
-      pvir /= 3.0
-      pvir /= 10.0 # convert kbar to GPa 
-      pressure.append(pvir) 
-    
-    # determine the number of complete scf steps in each vasprun.xml file
-    list_len +=  len(tree.findall("./calculation/energy/i[@name='total']"))
-    position     = position[0:list_len]
-    force        = force[0:list_len]
-    energy      = energy[0:list_len]
-    pressure  = pressure[0:list_len]
+    if i == 0:
+      # per-step data of all files is accumulated in growing arrays
+      position = ArrayBuffer((num_atoms,3), dtype=dtype) # Instantaneous atomic fractional positions 
+      force    = ArrayBuffer((num_atoms,3), dtype=dtype) # Instantaneous atomic forces in eV/Å
+      energy   = ArrayBuffer() # Instantaneous potential energy E0, or electronic free energy F (for ISMEAR=-1), in eV/atom. 
+      pressure = ArrayBuffer() # Instantaneous pressure in GPa
+
+    # keep only the complete scf steps of this vasprun.xml file
+    n_complete = steps['n_complete']
+    position.append(steps['position'][0:n_complete])
+    force.append(steps['force'][0:n_complete])
+    energy.append(steps['energy'][0:n_complete]/num_atoms)
+    pressure.append(steps['pressure'][0:n_complete])
+
+  position = position.data
+  force    = force.data
+  energy   = energy.data
+  pressure = pressure.data
 
   # compute the total pressure (i.e., virial + ideal gas)
-  for j in range(len(pressure)):
-    pressure[j] += pressure_ig
+  pressure += pressure_ig
 
   # if raw_files=True, generate the following raw data files: poscar_eq.dat, posfor.dat, energy.dat, and pressure.dat.
   if raw_files: 
@@ -234,6 +322,343 @@ def read(vasprun_files, force_tol=0.001, raw_files=False, fermi_dirac=False, ver
           'force': force, 'energy': energy, 'pressure': pressure, 'pressure_ig': pressure_ig, 'timestep': timestep, 'temperature': temperature, 'ismear': ismear}
 
 
+class LiveReader:
+  """
+  An incremental reader of a running AIMD simulation, whose (last) ``vasprun.xml`` file is still growing.
+
+  The reader remembers its byte offset and parser state in the growing file. Each call of :py:meth:`poll` parses only
+  the bytes appended since the previous call, and adds the newly completed ``<calculation>`` steps to the data.
+  Earlier (complete) ``vasprun.xml`` files of the same simulation, if any, are read once when the reader is created.
+
+  Parameters
+  -----------
+  vasprun_files : list
+    List of vasprun.xml files of the same AIMD simulation; the last one is followed while it grows.
+  force_tol : float
+    Force tolerance (in eV/Å) on initial configuration. *Default: 0.001*.
+  fermi_dirac : bool
+    If true, pyHMA uses the electronic free-energy surface F (not the ground-state E0 energy). *Default: False*
+  verbose : bool
+    If True, pyHMA will print simulation details once the header information is read. *Default: False*
+  dtype : numpy.dtype
+    Data type of the position and force arrays (see :py:func:`read`). *Default: float (float64)*
+
+  Example
+  --------
+
+  .. code-block:: python
+
+      >>> live = pyhma.LiveReader(['vasprun-1.xml', 'vasprun-2.xml'])
+      >>> batch, data = live.poll() # repeat every few minutes
+      >>> print(len(batch['energy']), 'new steps;', len(data['energy']), 'steps in total')
+
+  """
+
+  def __init__(self, vasprun_files, force_tol=0.001, fermi_dirac=False, verbose=False, dtype=float):
+    self.vasprun_files = list(vasprun_files)
+    self.dtype         = dtype
+    self.force_tol     = force_tol
+    self.fermi_dirac   = fermi_dirac
+    self.verbose       = verbose
+    self.offset        = 0    # number of bytes of the growing file parsed so far
+    self.data          = None # accumulated data (see read()), available once the header information is read
+    self._files_data   = [_read_file(f, fermi_dirac) for f in self.vasprun_files[0:-1]]
+    self._parser       = lxml.etree.XMLPullParser(events=('end',), tag='calculation', recover=True)
+    self._energy_name  = 'e_fr_energy' if fermi_dirac else 'e_0_energy'
+    self._n_calcs      = 0    # number of calculations found in the growing file
+
+  def poll(self):
+    """
+    Parse the bytes appended to the growing ``vasprun.xml`` file since the last call.
+
+    Returns
+    -------
+    batch : dict
+      The positions, forces, energies (eV/atom), and pressures (GPa) of the newly completed MD steps.
+    data : dict
+      The accumulated data of all complete MD steps so far, with the same keys as returned by :py:func:`read`
+      (None if the header information is not available yet). Arrays of both dictionaries are views that are valid until the next call.
+
+    """
+    with open(self.vasprun_files[-1], 'rb') as f:
+      f.seek(self.offset)
+      chunk = f.read()
+    self.offset += len(chunk)
+    self._parser.feed(chunk)
+
+    n_old = len(self._energy) if self.data is not None else 0
+    for event, calc in self._parser.read_events():
+      if self._n_calcs == 0:
+        self._start(calc.getparent())
+      values = _read_calculation(calc, self._energy_name, self._position.next_row(), self._force.next_row())
+      if values is not None:
+        self._position.commit_row()
+        self._force.commit_row()
+        self._energy.append([values[0]/self.data['num_atoms']])
+        self._pressure.append([values[1] + self.data['pressure_ig']])
+      # free the memory used by this calculation (the first one is kept for the header information)
+      if self._n_calcs > 0:
+        calc.clear()
+        calc.getparent().remove(calc)
+      self._n_calcs += 1
+
+    if self.data is None:
+      return None, None
+    self.data.update({'position': self._position.data, 'force': self._force.data,\
+                      'energy': self._energy.data, 'pressure': self._pressure.data})
+    batch = {k: self.data[k][n_old:] for k in ('position', 'force', 'energy', 'pressure')}
+    return batch, self.data
+
+  # read the header information once the first calculation of the growing file is complete
+  def _start(self, root):
+    header = _read_header(root)
+    files_data = self._files_data + [(header, _empty_steps(header['num_atoms']))]
+    self.data = _merge(self.vasprun_files, files_data, self.force_tol, False, self.fermi_dirac, self.verbose, self.dtype)
+    if self.data is None:
+      raise RuntimeError('Illegal vasprun.xml header information.')
+    self._position = ArrayBuffer((self.data['num_atoms'],3), dtype=self.dtype)
+    self._force    = ArrayBuffer((self.data['num_atoms'],3), dtype=self.dtype)
+    self._energy   = ArrayBuffer()
+    self._pressure = ArrayBuffer()
+    for array, buffer in zip(('position', 'force', 'energy', 'pressure'), (self._position, self._force, self._energy, self._pressure)):
+      buffer.append(self.data[array])
+    self._files_data = None
+
+
+def _empty_steps(num_atoms):
+  """
+  Return the per-step data of a file without complete steps.
+
+  """
+  return {'n_complete': 0, 'position': np.empty((0,num_atoms,3)), 'force': np.empty((0,num_atoms,3)), 'energy': np.empty(0), 'pressure': np.empty(0)}
+
+
+def _read_file(vasprun_file, fermi_dirac=False, stream=False, cache=False, cache_dir=None):
+  """
+  Parse a ``vasprun.xml`` file (or load its cache file) and extract its header information and per-step data.
+
+  Returns
+  -------
+  header : dict
+    Number of atoms (num_atoms), box volume (volume), box edge vectors (box_row_vecs), initial positions (basis), forces of
+    the first configuration (force_0), and the ISMEAR, POTIM (timestep), and TEBEG (temperature) INCAR parameters.
+  steps : dict
+    Positions, forces, energies (eV), and virial pressures (GPa) of the complete steps found in the file, and their number (n_complete).
+
+  """
+  if cache == True:
+    data = _cache.load(vasprun_file, fermi_dirac, cache_dir)
+    if data is not None:
+      return data
+
+  if stream:
+    tree, steps = _iterparse(vasprun_file, fermi_dirac) # parsing vasprun.xml one calculation at a time
+  else:
+    parser = lxml.etree.XMLParser(recover=True) # LXML parser with the capability to handle broken (incomplete) XML files
+    tree, steps = _parse(vasprun_file, parser, fermi_dirac) # parsing the whole vasprun.xml file 
+
+  header = _read_header(tree)
+  if cache:
+    try:
+      _cache.save(vasprun_file, header, steps, fermi_dirac, cache_dir)
+    except OSError as e: # e.g., an unwritable cache directory; the file is parsed again next time
+      print(' WARNING! Could not write the cache file of', vasprun_file, '(%s)' % e)
+  return header, steps
+
+
+def _read_header(tree):
+  """
+  Extract the header information of a ``vasprun.xml`` file (see :py:func:`_read_file`) from its (possibly pruned) XML tree.
+  The box, the initial positions, and the forces of the first configuration are None if they are not found (e.g., a
+  truncated file); they are required only for the first file (see :py:func:`_merge`).
+
+  """
+  return {'num_atoms':    int(tree.find("./atominfo/atoms").text),
+          'volume':       float(tree.find("./structure/crystal/i[@name='volume']").text),
+          'box_row_vecs': _read_varray(tree.find("./structure/crystal/varray[@name='basis']")),
+          'basis':        _read_varray(tree.find("./structure[@name='initialpos']/varray[@name='positions']")),
+          'force_0':      _read_varray(tree.find("./calculation/varray[@name='forces']")),
+          'ismear':       _read_incar(tree, 'ISMEAR', int),
+          'timestep':     _read_incar(tree, 'POTIM', float),
+          'temperature':  _read_incar(tree, 'TEBEG', float)}
+
+
+def _read_incar(tree, name, type):
+  """
+  Return the value of an INCAR parameter (converted to the given type), or None if it is not found.
+
+  """
+  elem = tree.find("./incar/i[@name='%s']" % name)
+  if elem is None:
+    return None
+  return type(elem.text)
+
+
+def _open(vasprun_file):
+  """
+  Open a ``vasprun.xml`` file for parsing. Compressed files (``.bz2``, ``.gz``, or ``.xz``) are decompressed on the fly
+  while being parsed, without a temporary file; other files are parsed directly from their path.
+
+  """
+  if vasprun_file.endswith('.bz2'):
+    return bz2.open(vasprun_file, 'rb')
+  elif vasprun_file.endswith('.gz'):
+    return gzip.open(vasprun_file, 'rb')
+  elif vasprun_file.endswith('.xz'):
+    return lzma.open(vasprun_file, 'rb')
+  return contextlib.nullcontext(vasprun_file)
+
+
+def _iterparse(vasprun_file, fermi_dirac):
+  """
+  Incrementally parse a ``vasprun.xml`` file and extract per-step data from each ``<calculation>`` element as soon as it is complete.
+
+  The extracted elements are cleared and removed from the tree, except the first one (used to check the initial forces), so that
+  the returned tree holds only the header information (INCAR, atoms, and initial structure).
+
+  Returns
+  -------
+  root : lxml.etree._Element
+    Root element of the (pruned) XML tree.
+  steps : dict
+    Positions, forces, energies (eV), and virial pressures (GPa) of the complete steps found in the file, and their number (n_complete).
+
+  """
+  energy_name = 'e_fr_energy' if fermi_dirac else 'e_0_energy'
+  position   = ArrayBuffer((0,3))
+  force      = ArrayBuffer((0,3))
+  energy     = ArrayBuffer()
+  pressure   = ArrayBuffer()
+  with _open(vasprun_file) as source:
+    context = lxml.etree.iterparse(source, events=('end',), tag='calculation', recover=True)
+    for n, (event, calc) in enumerate(context):
+      if n == 0:
+        num_atoms = int(calc.getparent().find("./atominfo/atoms").text)
+        position  = ArrayBuffer((num_atoms,3))
+        force     = ArrayBuffer((num_atoms,3))
+      values = _read_calculation(calc, energy_name, position.next_row(), force.next_row())
+      if values is not None:
+        position.commit_row()
+        force.commit_row()
+        energy.append([values[0]])
+        pressure.append([values[1]])
+      # free the memory used by this calculation
+      if n > 0:
+        calc.clear()
+        calc.getparent().remove(calc)
+
+  if position.row_shape[0] == 0: # no calculation (e.g., truncated file)
+    return context.root, _empty_steps(int(context.root.find("./atominfo/atoms").text))
+  steps = {'n_complete': len(energy), 'position': position.data, 'force': force.data, 'energy': energy.data, 'pressure': pressure.data}
+  return context.root, steps
+
+
+def _parse(vasprun_file, parser, fermi_dirac):
+  """
+  Parse a whole ``vasprun.xml`` file and extract its per-step data.
+
+  Returns
+  -------
+  tree : lxml.etree._ElementTree
+    The XML tree.
+  steps : dict
+    Positions, forces, energies (eV), and virial pressures (GPa) of the complete steps found in the file, and their number (n_complete).
+
+  """
+  with _open(vasprun_file) as source:
+    tree = lxml.etree.parse(source, parser)
+  num_atoms = int(tree.find("./atominfo/atoms").text)
+  energy_name = 'e_fr_energy' if fermi_dirac else 'e_0_energy'
+  calcs = tree.findall("./calculation")
+  position = np.empty((len(calcs), num_atoms, 3))
+  force    = np.empty((len(calcs), num_atoms, 3))
+  energy   = np.empty(len(calcs))
+  pressure = np.empty(len(calcs))
+  n = 0 # number of complete scf steps
+  for calc in calcs:
+    values = _read_calculation(calc, energy_name, position[n], force[n])
+    if values is not None:
+      energy[n], pressure[n] = values
+      n += 1
+
+  steps = {'n_complete': n, 'position': position[0:n], 'force': force[0:n], 'energy': energy[0:n], 'pressure': pressure[0:n]}
+  return tree, steps
+
+
+def _read_calculation(calc, energy_name, position, force):
+  """
+  Extract the data of a ``<calculation>`` element (one MD step) in a single pass over its children.
+
+  Positions and forces are written into the given ``position`` and ``force`` (atoms, 3) arrays. The energy is taken from
+  the last scf step. A step is complete if its total energy (``energy/i[@name='total']``) is found.
+
+  Returns
+  -------
+  values : tuple
+    Energy (eV) and virial pressure (GPa) of the step, or None if the step is incomplete (e.g., truncated file).
+
+  """
+  scstep = None
+  pvir   = None
+  has_position = has_force = complete = False
+  for child in calc:
+    if child.tag == 'scstep':
+      scstep = child
+    elif child.tag == 'structure':
+      pos_elem = child.find("./varray[@name='positions']")
+      has_position = pos_elem is not None and _read_varray(pos_elem, position) is not None
+    elif child.tag == 'varray':
+      if child.get('name') == 'forces':
+        has_force = _read_varray(child, force) is not None
+      elif child.get('name') == 'stress':
+        pvir = _read_pressure(child)
+    elif child.tag == 'energy':
+      complete = child.find("./i[@name='total']") is not None
+
+  if not (complete and has_position and has_force) or scstep is None or pvir is None:
+    return None
+  ee = scstep.find("./energy/i[@name='%s']" % energy_name)
+  if ee is None:
+    return None
+  return float(ee.text), pvir
+
+
+def _read_varray(varray, out=None):
+  """
+  Convert a ``varray`` element to a 2D NumPy array, parsing the text of all its ``<v>`` rows at once.
+
+  If ``out`` is given, the values are written into it. None is returned if the element is None (not found), or if the number
+  of values does not fit the number of rows (or the shape of ``out``), e.g., for a truncated file.
+
+  """
+  if varray is None:
+    return None
+  values = np.fromstring(' '.join([v.text or '' for v in varray]), sep=' ')
+  if out is None:
+    if len(varray) == 0 or values.size % len(varray) != 0:
+      return None
+    return values.reshape(len(varray), -1)
+  if values.size != out.size:
+    return None
+  out[...] = values.reshape(out.shape)
+  return out
+
+
+def _read_pressure(pvir_elem):
+  """
+  Compute the virial pressure (GPa) from a ``stress`` varray element (kbar); i.e., the average of its diagonal.
+  None is returned if the element is not a complete 3x3 tensor (e.g., for a truncated file).
+
+  """
+  stress = _read_varray(pvir_elem)
+  if stress is None or stress.shape != (3,3):
+    return None
+  pvir = np.trace(stress)
+  pvir /= 3.0
+  pvir /= 10.0 # convert kbar to GPa
+  return pvir
+
+
 def _is_large_force(force, force_tol):
 
   """
@@ -253,39 +678,31 @@ def _is_large_force(force, force_tol):
 def  _make_raw_files(num_atoms, box_row_vecs, basis, position, force, energy, pressure):
   """
   Generate the following raw data files: poscar_eq.dat, posfor.dat, energy.dat, and pressure.dat. 
+  Each file is formatted and written in large chunks of MD steps (see :py:func:`pyhma.output.write_text`).
 
   """
   
-  file_poscar_eq = open('poscar_eq.dat', 'w') # initial POSCAR file (in fractional coordinates)
-  file_posfor    = open('posfor.dat', 'w') # instantaneous 
-  file_energy    = open('energy.dat', 'w')
-  file_pressure  = open('pressure.dat', 'w')
-  # generate poscar_eq file 
-  print('Lattice vectors\n1.0 scaling factor', file = file_poscar_eq)
-  for i in range(len(box_row_vecs)):
-    print('%12.8f %12.8f %12.8f' % (*box_row_vecs[i],) , file=file_poscar_eq)
-  print(num_atoms,' atoms (total)\nDirect', file=file_poscar_eq)
-  for i in range(len(basis)):
-    print('%12.8f %12.8f %12.8f' % (*basis[i],) , file=file_poscar_eq)
- 
-
-  # generate posfor file
-  for i in range(len(position)):
-    print(i, file=file_posfor)
-    for j in range(len(position[i])):  
-      print('%12.8f %12.8f %12.8f    %12.8f %12.8f %12.8f' % (*position[i][j], *force[i][j]), file=file_posfor)
+  # generate poscar_eq file (initial POSCAR file, in fractional coordinates)
+  with open('poscar_eq.dat', 'w') as file_poscar_eq:
+    print('Lattice vectors\n1.0 scaling factor', file = file_poscar_eq)
+    output.write_text(file_poscar_eq, box_row_vecs, '%12.8f %12.8f %12.8f')
+    print(num_atoms,' atoms (total)\nDirect', file=file_poscar_eq)
+    output.write_text(file_poscar_eq, basis, '%12.8f %12.8f %12.8f')
+
+  # generate posfor file: for each step, its index followed by the positions and forces of all atoms
+  with open('posfor.dat', 'w') as file_posfor:
+    chunk = max(1, 2**14//num_atoms) # MD steps
+    for start in range(0, len(position), chunk):
+      stop = min(start+chunk, len(position))
+      rows = np.empty((stop-start, num_atoms, 6))
+      rows[:,:,0:3] = position[start:stop]
+      rows[:,:,3:6] = force[start:stop]
+      rows = np.column_stack((np.arange(start, stop), rows.reshape(stop-start, -1)))
+      output.write_text(file_posfor, rows, '%d' + '\n%12.8f %12.8f %12.8f    %12.8f %12.8f %12.8f'*num_atoms)
 
   # generate energy file
-  for i in range(len(energy)):
-    print('%12.8f' % (energy[i]) , file=file_energy)
+  output.write_text('energy.dat', np.reshape(energy, (-1,1)), '%12.8f')
  
   # generate virial pressure file
-  for i in range(len(pressure)):
-    print('%12.8f' % (pressure[i]) , file=file_pressure)
- 
-  # close all files 
-  file_poscar_eq.close()
-  file_posfor.close()
-  file_energy.close()
-  file_pressure.close()
+  output.write_text('pressure.dat', np.reshape(pressure, (-1,1)), '%12.8f')
  
@@ -11,5 +11,5 @@ setup(name='pyHMA',
       author='Sabry Moustafa',
       author_email='sabrygad@buffalo.edu',
       packages=['pyhma'],
-      scripts=['scripts/pyhma']
+      scripts=['scripts/pyhma', 'scripts/pyhma_batch']
       )
@@ -0,0 +1,108 @@
+########################################################################
+# pyHMA: A Python Library for HMA
+#
+# Copyright (c) 2020 University at Buffalo
+#
+# Authors: Sabry Moustafa, Andrew Schultz, and David Kofke
+#
+# pyHMA is free software: you can modify and/or redistribute it under
+# the terms of the Mozilla Public License.
+#
+# pyHMA is distributed in the hope that it will be useful, but without
+# any warranty. See the Mozilla Public License for more details.
+#
+########################################################################
+
+import os
+import stat
+import numpy as np
+import pytest
+import pyhma
+from pyhma import cache
+
+
+# a small vasprun.xml (simple cubic, 8 atoms) whose first step is the lattice configuration
+def _write_vasprun(path, n_steps=20, seed=1):
+  rng = np.random.default_rng(seed)
+  box = 4.0*np.eye(3)
+  basis = np.array([(i, j, k) for i in (0, 0.5) for j in (0, 0.5) for k in (0, 0.5)])
+  lines = ['<?xml version="1.0" encoding="ISO-8859-1"?>', '<modeling>',
+           ' <incar>', '  <i type="int" name="ISMEAR"> 1</i>', '  <i name="POTIM"> 2.0</i>', '  <i name="TEBEG"> 1000.0</i>', ' </incar>',
+           ' <atominfo>', '  <atoms> %d</atoms>' % len(basis), ' </atominfo>']
+  def structure(name, position):
+    lines.append(' <structure%s>' % (' name="%s"' % name if name else ''))
+    lines.append('  <crystal>')
+    lines.append('   <varray name="basis">')
+    lines.extend('    <v> %.8f %.8f %.8f </v>' % tuple(v) for v in box)
+    lines.append('   </varray>')
+    lines.append('   <i name="volume"> %.8f </i>' % np.linalg.det(box))
+    lines.append('  </crystal>')
+    lines.append('  <varray name="positions">')
+    lines.extend('   <v> %.8f %.8f %.8f </v>' % tuple(v) for v in position)
+    lines.append('  </varray>')
+    lines.append(' </structure>')
+  structure('initialpos', basis)
+  for n in range(n_steps):
+    position = basis if n == 0 else (basis + rng.normal(scale=0.01, size=basis.shape)) % 1
+    force = np.zeros(basis.shape) if n == 0 else rng.normal(scale=0.1, size=basis.shape)
+    energy = -40 + rng.normal(scale=0.1)
+    lines.append(' <calculation>')
+    lines.append('  <scstep>')
+    lines.append('   <energy><i name="e_fr_energy"> %.8f </i><i name="e_0_energy"> %.8f </i></energy>' % (energy, energy))
+    lines.append('  </scstep>')
+    structure(None, position)
+    lines.append('  <varray name="forces">')
+    lines.extend('   <v> %.8f %.8f %.8f </v>' % tuple(v) for v in force)
+    lines.append('  </varray>')
+    lines.append('  <varray name="stress">')
+    lines.extend('   <v> %.8f %.8f %.8f </v>' % tuple(v) for v in 100*np.eye(3) + rng.normal(size=(3,3)))
+    lines.append('  </varray>')
+    lines.append('  <energy><i name="e_fr_energy"> %.8f </i><i name="e_0_energy"> %.8f </i><i name="total"> %.8f </i></energy>'\
+                 % (energy, energy, energy))
+    lines.append(' </calculation>')
+  lines.append('</modeling>')
+  with open(path, 'w') as f:
+    f.write('\n'.join(lines) + '\n')
+
+
+def test_cache_round_trip(tmp_path):
+  vasprun_file = str(tmp_path / 'vasprun.xml')
+  _write_vasprun(vasprun_file)
+  data = pyhma.read([vasprun_file])
+  data_cached = pyhma.read([vasprun_file], cache=True)
+  assert os.path.exists(cache.get_path(vasprun_file))
+  data_loaded = pyhma.read([vasprun_file], cache=True)
+  for k in ('position', 'force', 'energy', 'pressure'):
+    assert np.array_equal(data_cached[k], data[k])
+    assert np.array_equal(data_loaded[k], data[k])
+
+
+def test_unwritable_cache_dir(tmp_path, capsys):
+  vasprun_file = str(tmp_path / 'vasprun.xml')
+  _write_vasprun(vasprun_file)
+  data = pyhma.read([vasprun_file])
+  cache_dir = tmp_path / 'cache'
+  cache_dir.mkdir()
+  cache_dir.chmod(stat.S_IRUSR | stat.S_IXUSR)
+  try:
+    if os.access(str(cache_dir), os.W_OK):
+      pytest.skip('the cache directory is writable (e.g., by root)')
+    data_cached = pyhma.read([vasprun_file], cache=True, cache_dir=str(cache_dir))
+  finally:
+    cache_dir.chmod(stat.S_IRWXU)
+  assert 'Could not write the cache file' in capsys.readouterr().out
+  assert os.listdir(str(cache_dir)) == []
+  for k in ('position', 'force', 'energy', 'pressure'):
+    assert np.array_equal(data_cached[k], data[k])
+
+
+def test_cache_dir_not_a_directory(tmp_path, capsys):
+  # a cache directory below a regular file can not be created or written, also by root
+  vasprun_file = str(tmp_path / 'vasprun.xml')
+  _write_vasprun(vasprun_file)
+  data = pyhma.read([vasprun_file])
+  (tmp_path / 'file').write_text('')
+  data_cached = pyhma.read([vasprun_file], cache=True, cache_dir=str(tmp_path / 'file' / 'cache'))
+  assert 'Could not write the cache file' in capsys.readouterr().out
+  for k in ('position', 'force', 'energy', 'pressure'):
+    assert np.array_equal(data_cached[k], data[k])